@@ -0,0 +1,210 @@
+# agents/bm25_index.py
+"""
+Index lexical BM25 des chunks (index inversé compact)
+
+Postings en tableaux numpy (format CSR) :
+- offsets     : int64  (termes + 1), postings du terme t = [offsets[t], offsets[t + 1])
+- doc_ids     : uint32, position du chunk (alignée sur l'index FAISS)
+- term_freqs  : uint16, fréquence du terme dans le chunk
+- doc_lengths : uint32 (chunks), nombre de termes indexés par chunk
+Fichier : vector_db/doxa_kb.bm25.npz, lié au bundle par sa version (CRC d'en-tête)
+
+Complète la recherche dense sur les tokens exacts : "Erreur 500", "Pro", "2FA"...
+"""
+
+import re
+import unicodedata
+import numpy as np
+from array import array
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LEXICAL_FILE = "doxa_kb.bm25.npz"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a au aux avec ce ces cet cette d dans de des du elle en est et il ils je
+    l la le les leur leurs ma mais me mes n ne nous on ou par pas pour qu que
+    qui s sa sans se ses son sont sur ta te tes ton tu un une vos votre vous y
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules, sans accents, alphanumérique, mots vides retirés"""
+    folded = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return [token for token in TOKEN_PATTERN.findall(folded) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Index inversé BM25 (k1, b) sur les textes des chunks
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        num_docs = len(doc_lengths)
+        doc_freqs = np.diff(offsets).astype("float32")
+        self.idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype("float32")
+        self.avg_length = float(doc_lengths.mean()) if num_docs and doc_lengths.any() else 1.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        terms, doc_ids, term_freqs, doc_lengths = cls._postings(texts, vocab, first_doc=0)
+        return cls._from_postings(vocab, terms, doc_ids, term_freqs, doc_lengths, k1, b)
+
+    def update(self, keep: np.ndarray, new_texts: Iterable[str]) -> "BM25Index":
+        """
+        Index après ré-indexation incrémentale, sans re-tokeniser les chunks
+        conservés : postings des chunks gardés (masque `keep` sur les anciennes
+        positions, ordre conservé) renumérotés, puis postings des nouveaux
+        chunks, placés en fin de table
+        """
+        positions = np.cumsum(keep) - 1
+        posting_terms = np.repeat(np.arange(len(self.offsets) - 1, dtype="uint32"), np.diff(self.offsets))
+        kept = keep[self.doc_ids]
+
+        vocab = dict(self.vocab)
+        terms, doc_ids, term_freqs, doc_lengths = self._postings(new_texts, vocab, first_doc=int(keep.sum()))
+
+        return self._from_postings(
+            vocab,
+            np.concatenate([posting_terms[kept], terms]),
+            np.concatenate([positions[self.doc_ids[kept]].astype("uint32"), doc_ids]),
+            np.concatenate([self.term_freqs[kept], term_freqs]),
+            np.concatenate([self.doc_lengths[keep], doc_lengths]),
+            self.k1,
+            self.b
+        )
+
+    @staticmethod
+    def _postings(
+        texts: Iterable[str],
+        vocab: Dict[str, int],
+        first_doc: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(terme, chunk, fréquence) des textes, chunks numérotés à partir de first_doc ; complète vocab"""
+        term_ids = array("I")
+        doc_ids = array("I")
+        term_freqs = array("H")
+        doc_lengths = array("I")
+
+        for doc_id, text in enumerate(texts, start=first_doc):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                term_freqs.append(min(count, 0xFFFF))
+
+        return (
+            np.frombuffer(term_ids, dtype="uint32"),
+            np.frombuffer(doc_ids, dtype="uint32"),
+            np.frombuffer(term_freqs, dtype="uint16"),
+            np.frombuffer(doc_lengths, dtype="uint32").copy()
+        )
+
+    @classmethod
+    def _from_postings(
+        cls,
+        vocab: Dict[str, int],
+        terms: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float,
+        b: float
+    ) -> "BM25Index":
+        # Tri par terme (stable : les chunks restent dans l'ordre dans chaque liste)
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype="int64")
+        offsets[1:] = np.cumsum(np.bincount(terms, minlength=len(vocab)))
+        return cls(vocab, offsets, doc_ids[order], term_freqs[order], doc_lengths, k1, b)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def num_postings(self) -> int:
+        return len(self.doc_ids)
+
+    def summary(self) -> str:
+        return f"{len(self.vocab)} termes, {self.num_postings} postings"
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k BM25 (positions, scores), restreint aux chunks du masque s'il est donné.
+        Seuls les chunks contenant au moins un terme de la requête sont retournés.
+        """
+        term_ids = sorted({self.vocab[token] for token in tokenize(query) if token in self.vocab})
+        scores = np.zeros(self.num_docs, dtype="float32")
+
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype("float32")
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avg_length)
+            # Un chunk apparaît une seule fois par liste : affectation directe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return top, scores[top]
+
+    # --------------------------------------------------
+    # Persistance
+    # --------------------------------------------------
+    def save(self, path: Path, kb_version: int):
+        """Écriture atomique, liée à la version du bundle"""
+        path = Path(path)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                kb_version=np.array(kb_version, dtype="int64"),
+                params=np.array([self.k1, self.b], dtype="float64"),
+                terms=np.array(terms, dtype=str),
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs,
+                doc_lengths=self.doc_lengths
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Tuple["BM25Index", int]:
+        with np.load(path) as data:
+            terms = data["terms"].tolist()
+            k1, b = data["params"].tolist()
+            index = cls(
+                {term: i for i, term in enumerate(terms)},
+                data["offsets"],
+                data["doc_ids"],
+                data["term_freqs"],
+                data["doc_lengths"],
+                k1,
+                b
+            )
+            return index, int(data["kb_version"])
@@ -0,0 +1,312 @@
+# agents/chunk_store.py
+"""
+Table de chunks en colonnes
+
+Un chunk n'est pas une chaîne : c'est un span (document, début, fin, page)
+sur le texte extrait. Les documents sont concaténés en UTF-8 dans un blob
+unique (bytearray en mémoire, memoryview sur le bundle mappé) ; les chunks
+qui se recouvrent partagent les mêmes octets et le texte n'est décodé qu'à
+l'accès.
+
+Colonnes (tableaux numpy compacts) :
+- source_ids    : uint16, indice dans `sources` (noms internés) = document
+- chunk_ids     : uint32
+- length_tokens : uint32
+- token_start / token_end : uint32, span du chunk en mots ou en tokens de
+  l'embedder selon le mode de chunking
+- text_start / text_end   : uint32, span en octets dans le document
+- page          : uint16, page du début du chunk (0 : inconnue)
+
+Chaque source porte aussi sa clé de document canonique (doc_registry),
+fixée à l'ingestion : les filtres du Query Processor s'y résolvent.
+"""
+
+import sys
+import numpy as np
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from agents.doc_registry import doc_key_for, normalize_doc_name
+
+# Colonnes de la table de chunks : nom → dtype
+CHUNK_COLUMNS = {
+    "source_ids": "uint16",
+    "chunk_ids": "uint32",
+    "length_tokens": "uint32",
+    "token_start": "uint32",
+    "token_end": "uint32",
+    "text_start": "uint32",
+    "text_end": "uint32",
+    "page": "uint16",
+}
+
+# Clé correspondante dans les métadonnées produites par le chunking
+_META_KEYS = {"chunk_ids": "chunk_id"}
+
+
+class ChunkHit:
+    """
+    Résultat de recherche léger : position dans la table + scores.
+    S'utilise comme un dict (hit['source'], hit.get('rerank_score', ...))
+    pour rester compatible avec les agents et la base de résultats.
+    """
+
+    __slots__ = ("store", "idx", "score", "rerank_score", "lexical_score", "relevance_score", "spans")
+
+    FIELDS = (
+        "text", "source", "chunk_id", "page", "score", "idx",
+        "rerank_score", "lexical_score", "relevance_score"
+    )
+    WRITABLE = ("score", "rerank_score", "lexical_score", "relevance_score")
+
+    def __init__(self, store: "ChunkStore", idx: int, score: float):
+        self.store = store
+        self.idx = idx
+        self.score = score
+        self.rerank_score: Optional[float] = None
+        self.lexical_score: Optional[float] = None
+        self.relevance_score: Optional[float] = None
+        # Passages affichés (spans en octets du document) quand le chunk est
+        # réduit : recouvrement retiré, phrases sélectionnées
+        self.spans: Optional[List[Tuple[int, int]]] = None
+
+    @property
+    def text(self) -> str:
+        if self.spans is None:
+            return self.store.text(self.idx)
+        return " [...] ".join(self.store.text(self.idx, span).strip() for span in self.spans)
+
+    @property
+    def source(self) -> str:
+        return self.store.source(self.idx)
+
+    @property
+    def chunk_id(self) -> int:
+        return int(self.store.chunk_ids[self.idx])
+
+    @property
+    def page(self) -> int:
+        return int(self.store.page[self.idx])
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key not in self.WRITABLE:
+            raise KeyError(f"champ non modifiable : {key}")
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS and getattr(self, key) is not None
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return [key for key in self.FIELDS if key in self]
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"ChunkHit({self.source}#{self.chunk_id}, p.{self.page}, score={self.score:.3f})"
+
+
+class ChunkTexts(Sequence):
+    """
+    Textes des chunks en lecture paresseuse : s'utilise comme une liste
+    (len(), [i], itération), un texte n'est découpé et décodé qu'à l'accès
+    """
+
+    def __init__(self, store: "ChunkStore"):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("index de chunk hors limites")
+
+        return self.store.text(i)
+
+
+class ChunkStore:
+    """
+    Table de chunks en colonnes, alignée sur les positions de l'index FAISS
+    """
+
+    def __init__(
+        self,
+        doc_blob: Union[bytearray, memoryview],
+        sources: List[str],
+        doc_ranges: List[Tuple[int, int]],
+        columns: Dict[str, np.ndarray],
+        doc_keys: Optional[List[Optional[str]]] = None
+    ):
+        self.doc_blob = doc_blob
+        self.sources = [sys.intern(name) for name in sources]
+        # Document de chaque source : doc_blob[début:fin]
+        self.doc_ranges = [(int(start), int(end)) for start, end in doc_ranges]
+        # Clé canonique de chaque source (None : document hors registre)
+        self.doc_keys = list(doc_keys) if doc_keys is not None else [doc_key_for(name) for name in self.sources]
+        self._source_index = {name: i for i, name in enumerate(self.sources)}
+
+        for name in CHUNK_COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return cls(
+            bytearray(), [], [],
+            {name: np.empty(0, dtype) for name, dtype in CHUNK_COLUMNS.items()}
+        )
+
+    def __len__(self) -> int:
+        return len(self.source_ids)
+
+    # --------------------------------------------------
+    # Accès
+    # --------------------------------------------------
+    @property
+    def texts(self) -> ChunkTexts:
+        return ChunkTexts(self)
+
+    def text(self, i: int, span: Optional[Tuple[int, int]] = None) -> str:
+        """Texte du chunk, ou d'un sous-span (octets relatifs au document) de celui-ci"""
+        start, end = span if span is not None else (int(self.text_start[i]), int(self.text_end[i]))
+        doc_start = self.doc_ranges[self.source_ids[i]][0]
+        return str(self.doc_blob[doc_start + start:doc_start + end], "utf-8")
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return int(self.text_start[i]), int(self.text_end[i])
+
+    def document(self, name: str) -> str:
+        start, end = self.doc_ranges[self._source_index[name]]
+        return str(self.doc_blob[start:end], "utf-8")
+
+    def source(self, i: int) -> str:
+        return self.sources[self.source_ids[i]]
+
+    def source_id(self, name: str) -> Optional[int]:
+        return self._source_index.get(name)
+
+    def resolve_sources(self, names: Iterable[str]) -> List[str]:
+        """
+        Sources désignées par des noms de fichiers ou des clés canoniques
+        ('troubleshooting' → ['Troubleshooting_Support']), sans doublons
+        """
+        resolved = {}
+        for name in names:
+            if name in self._source_index:
+                resolved[name] = None
+                continue
+            key = normalize_doc_name(name)
+            for source, doc_key in zip(self.sources, self.doc_keys):
+                if doc_key == key:
+                    resolved[source] = None
+        return list(resolved)
+
+    def hit(self, i: int, score: float) -> ChunkHit:
+        return ChunkHit(self, int(i), float(score))
+
+    def records(self) -> Iterator[Dict]:
+        """Itère les métadonnées sous forme de dicts (export, compatibilité)"""
+        for i in range(len(self)):
+            record = {"source": self.source(i)}
+            for name in list(CHUNK_COLUMNS)[1:]:
+                record[_META_KEYS.get(name, name)] = int(getattr(self, name)[i])
+            yield record
+
+    def source_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.source_ids, minlength=len(self.sources))
+        return {name: int(count) for name, count in zip(self.sources, counts) if count}
+
+    # --------------------------------------------------
+    # Filtrage vectorisé
+    # --------------------------------------------------
+    def source_mask(self, names: Iterable[str]) -> np.ndarray:
+        """Masque booléen des chunks appartenant aux sources données"""
+        ids = [self._source_index[name] for name in names if name in self._source_index]
+        return np.isin(self.source_ids, np.array(ids, dtype=self.source_ids.dtype))
+
+    # --------------------------------------------------
+    # Mise à jour (ré-indexation incrémentale)
+    # --------------------------------------------------
+    def add_document(self, name: str, text: str) -> int:
+        """Ajoute (ou remplace) le texte d'un document, retourne son identifiant de source"""
+        if not isinstance(self.doc_blob, bytearray):
+            self.doc_blob = bytearray(self.doc_blob)
+
+        if name not in self._source_index:
+            self._source_index[name] = len(self.sources)
+            self.sources.append(sys.intern(name))
+            self.doc_ranges.append((0, 0))
+            self.doc_keys.append(doc_key_for(name))
+
+        source_id = self._source_index[name]
+        start = len(self.doc_blob)
+        self.doc_blob += text.encode("utf-8")
+        self.doc_ranges[source_id] = (start, len(self.doc_blob))
+        return source_id
+
+    def append(self, metadata: List[Dict]):
+        """Ajoute des chunks dont les documents sont déjà enregistrés (add_document)"""
+        self.source_ids = np.concatenate([
+            self.source_ids,
+            np.array([self._source_index[meta["source"]] for meta in metadata], dtype=CHUNK_COLUMNS["source_ids"])
+        ])
+        for name, dtype in list(CHUNK_COLUMNS.items())[1:]:
+            key = _META_KEYS.get(name, name)
+            values = np.array([meta[key] for meta in metadata], dtype=dtype)
+            setattr(self, name, np.concatenate([getattr(self, name), values]))
+
+    def extend(self, other: "ChunkStore"):
+        """Ajoute les documents et les chunks d'une autre table"""
+        remap = np.zeros(max(len(other.sources), 1), dtype=CHUNK_COLUMNS["source_ids"])
+        for source_id, name in enumerate(other.sources):
+            remap[source_id] = self.add_document(name, other.document(name))
+
+        self.source_ids = np.concatenate([self.source_ids, remap[other.source_ids]])
+        for name in list(CHUNK_COLUMNS)[1:]:
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+
+    def drop_sources(self, names: Iterable[str]) -> int:
+        """
+        Retire les chunks des sources données, en conservant l'ordre.
+        Le blob est compacté : seuls les documents encore présents sont recopiés.
+        """
+        names = set(names) & set(self.sources)
+        if not names:
+            return 0
+
+        keep = ~self.source_mask(names)
+        removed = int(len(self) - keep.sum())
+
+        blob = bytearray()
+        for source_id, name in enumerate(self.sources):
+            start, end = self.doc_ranges[source_id]
+            if name in names:
+                self.doc_ranges[source_id] = (0, 0)
+                continue
+            self.doc_ranges[source_id] = (len(blob), len(blob) + end - start)
+            blob += self.doc_blob[start:end]
+        self.doc_blob = blob
+
+        if removed:
+            for name in CHUNK_COLUMNS:
+                setattr(self, name, getattr(self, name)[keep])
+        return removed
@@ -0,0 +1,170 @@
+# agents/cross_encoder_reranker.py
+"""
+Reranking par cross-encoder (CPU), optionnel
+
+Le bi-encoder compare deux vecteurs calculés séparément ; le cross-encoder
+lit la paire (requête, chunk) en entier et produit un score de pertinence
+dans [0, 1], utilisable directement comme confiance par l'évaluateur.
+
+- Budget : millisecondes par ticket. Le coût par paire est estimé en continu
+  (moyenne mobile exponentielle) ; seuls les meilleurs candidats qui tiennent
+  dans le budget sont scorés, les autres gardent leur rang après eux.
+- Cache : score par (hash de la requête, position du chunk), LRU borné
+"""
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from agents.chunk_store import ChunkHit
+from agents.embedding_cache import EmbeddingCache
+
+# Cross-encoder multilingue (MS MARCO traduit, dont le français)
+CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class CrossEncoderReranker:
+    """
+    Reranker cross-encoder sous budget de latence, avec cache de scores
+    """
+
+    def __init__(
+        self,
+        model_name: str = CROSS_ENCODER_MODEL,
+        budget_ms: float = 150.0,
+        batch_size: int = 8,
+        min_pairs: int = 4,
+        cache_size: int = 4096
+    ):
+        from sentence_transformers import CrossEncoder
+
+        print(f"Chargement du cross-encoder ({model_name})...")
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        # Nombre de paires toujours scorées, même si le budget est dépassé
+        self.min_pairs = min_pairs
+
+        # Coût estimé d'une paire (ms), affiné à chaque batch
+        self.ms_per_pair = None
+
+        self.cache_size = cache_size
+        self._scores: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rerank(self, query: str, results: List[ChunkHit]) -> List[ChunkHit]:
+        """
+        Score de pertinence des meilleurs candidats (champ relevance_score),
+        dans la limite du budget. Retourne les candidats scorés triés par
+        pertinence, suivis des autres dans leur ordre d'origine.
+        """
+        if not results:
+            return results
+
+        query_key = EmbeddingCache.key(query)
+        limit = self._pair_limit(len(results))
+        candidates, rest = results[:limit], results[limit:]
+        pending = self._lookup(query_key, candidates)
+
+        # Paires à scorer, par batch, tant que le budget le permet
+        start = time.perf_counter()
+        scored = 0
+        for offset in range(0, len(pending), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if scored >= self.min_pairs and elapsed_ms >= self.budget_ms:
+                break
+            scored += self._predict(query, query_key, pending[offset:offset + self.batch_size])
+
+        with self._lock:
+            self.misses += scored
+
+        ranked = sorted(
+            (hit for hit in candidates if hit.relevance_score is not None),
+            key=lambda hit: hit.relevance_score,
+            reverse=True
+        )
+        unscored = [hit for hit in candidates if hit.relevance_score is None]
+        return ranked + unscored + rest
+
+    def score_missing(self, query: str, results: List[ChunkHit]) -> List[ChunkHit]:
+        """
+        Complète relevance_score des résultats qui n'en ont pas (coupés par
+        le budget, voisins ajoutés après le reranking), sans budget : réservé
+        aux extraits finaux (au plus top_k paires). L'ordre n'est pas modifié.
+        """
+        query_key = EmbeddingCache.key(query)
+        pending = self._lookup(query_key, [hit for hit in results if hit.relevance_score is None])
+
+        scored = 0
+        for offset in range(0, len(pending), self.batch_size):
+            scored += self._predict(query, query_key, pending[offset:offset + self.batch_size])
+
+        with self._lock:
+            self.misses += scored
+        return results
+
+    def _lookup(self, query_key: str, hits: List[ChunkHit]) -> List[ChunkHit]:
+        """Applique les scores déjà connus ; retourne les candidats restant à scorer"""
+        pending = []
+        with self._lock:
+            for hit in hits:
+                score = self._scores.get((query_key, hit.idx))
+                if score is None:
+                    pending.append(hit)
+                    continue
+                self._scores.move_to_end((query_key, hit.idx))
+                hit['relevance_score'] = score
+            self.hits += len(hits) - len(pending)
+        return pending
+
+    def _predict(self, query: str, query_key: str, batch: List[ChunkHit]) -> int:
+        """Score un batch de paires (texte complet du chunk, même si l'extrait est réduit)"""
+        batch_start = time.perf_counter()
+        scores = self.model.predict(
+            [(query, hit.store.text(hit.idx)) for hit in batch],
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        self._observe((time.perf_counter() - batch_start) * 1000 / len(batch))
+
+        scores = np.clip(np.asarray(scores, dtype="float32").reshape(-1), 0.0, 1.0)
+        for hit, score in zip(batch, scores):
+            hit['relevance_score'] = float(score)
+        self._store({(query_key, hit.idx): float(score) for hit, score in zip(batch, scores)})
+        return len(batch)
+
+    def _pair_limit(self, num_results: int) -> int:
+        """Nombre de candidats que le budget permet de scorer (tous tant que le coût est inconnu)"""
+        if self.ms_per_pair is None:
+            return num_results
+        return max(self.min_pairs, min(num_results, int(self.budget_ms / self.ms_per_pair)))
+
+    def _observe(self, ms_per_pair: float, alpha: float = 0.3):
+        if self.ms_per_pair is None:
+            self.ms_per_pair = ms_per_pair
+        else:
+            self.ms_per_pair = (1 - alpha) * self.ms_per_pair + alpha * ms_per_pair
+
+    def _store(self, scores: Dict[Tuple[str, int], float]):
+        with self._lock:
+            for key, score in scores.items():
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ms_per_pair": self.ms_per_pair
+        }
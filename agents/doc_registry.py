@@ -0,0 +1,46 @@
+# agents/doc_registry.py
+"""
+Registre des documents de la KB
+
+Le Query Processor désigne les documents par des clés canoniques
+(troubleshooting, guide_securite, ...), l'index par le nom du fichier source
+(Troubleshooting_Support, "Doxa Conditions générales", ...).
+La correspondance est établie à l'ingestion : une source reçoit la clé dont
+tous les mots apparaissent dans son nom normalisé (sans accents, minuscules).
+"""
+
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+# Clés canoniques des documents de la KB Doxa
+DOC_KEYS = (
+    "troubleshooting",
+    "guide_securite",
+    "tarification",
+    "guide_utilisateur",
+    "guide_onboarding",
+    "faq",
+    "conditions_generales",
+)
+
+
+def normalize_doc_name(name: str) -> str:
+    """'Doxa Conditions générales' → 'doxa_conditions_generales'"""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", ascii_name.lower()).strip("_")
+
+
+def doc_key_for(source: str, keys: Iterable[str] = DOC_KEYS) -> Optional[str]:
+    """
+    Clé canonique d'une source : la plus spécifique (le plus de mots) dont
+    tous les mots figurent dans le nom de la source, None si aucune
+    """
+    words = set(normalize_doc_name(source).split("_"))
+
+    best = None
+    for key in keys:
+        key_words = key.split("_")
+        if set(key_words) <= words and (best is None or len(key_words) > len(best.split("_"))):
+            best = key
+    return best
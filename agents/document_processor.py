@@ -4,20 +4,152 @@ Critère 1 (12%) : Extraction, Chunking et Embedding
 
 Pipeline :
 1. Extraction : PDFs → Markdown
-2. Chunking : Sémantique par phrases (~500 tokens, overlap)
+2. Chunking : Sémantique par phrases (~500 tokens, overlap), spans avec page
 3. Embedding : SentenceTransformer (all-MiniLM-L6-v2)
-4. Stockage : FAISS (cosine similarity) + métadonnées
+4. Stockage : bundle binaire (index FAISS cosine + documents + table de chunks)
+5. Manifest : hash par fichier source → ré-indexation incrémentale
+6. Index dérivés à côté du bundle : BM25, phrases (optionnel), voisins des chunks,
+   mis à jour incrémentalement avec le bundle
 """
 
 import re
 import json
+import time
+import hashlib
+from bisect import bisect_right
+from itertools import islice
 import faiss
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Sequence, Callable
 from PyPDF2 import PdfReader
 from sentence_transformers import SentenceTransformer
 import random
+from array import array
+
+from agents.embedding_cache import EmbeddingCache
+from agents.chunk_store import CHUNK_COLUMNS, ChunkStore
+from agents.doc_registry import doc_key_for
+from agents.kb_bundle import BUNDLE_FILE, BundleWriter, KBBundle, write_bundle
+from agents.bm25_index import LEXICAL_FILE, BM25Index
+from agents.sentence_index import SENTENCE_FILE, SentenceIndex
+from agents.neighbour_table import NEIGHBOUR_FILE, NeighbourTable
+
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+MANIFEST_VERSION = 1
+CHUNKING_MODES = ("words", "tokens")
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+PAGE_HEADER = re.compile(r'^## Page (\d+)\b', re.MULTILINE)
+
+
+def _file_sha256(path: Path) -> str:
+    """Hash SHA-256 d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _format_page(page_num: int, text: str) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    return f"## Page {page_num}\n\n{text}\n\n"
+
+
+def _extract_page_range(pdf_path: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+    """
+    Extrait les pages [start, end) d'un PDF au format Markdown (end=None : jusqu'à la fin).
+    Fonction de module pour être sérialisable par ProcessPoolExecutor.
+    """
+    reader = PdfReader(pdf_path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    return [
+        _format_page(page_num + 1, reader.pages[page_num].extract_text() or "")
+        for page_num in range(start, end)
+    ]
+
+
+class _BundleSpool:
+    """
+    Écriture en flux de la KB : le texte des documents est déversé page par
+    page dans un fichier temporaire, la table de chunks est tenue en colonnes
+    compactes (26 octets par chunk). Les textes des chunks sont relus dans le
+    fichier pour l'encodage ; le bundle est assemblé à la fin par copie
+    séquentielle, sans jamais charger les documents en mémoire.
+    """
+
+    _TYPECODES = {"uint16": "H", "uint32": "I"}
+
+    def __init__(self, index_dir: Path):
+        self.bundle_path = index_dir / BUNDLE_FILE
+        self.spool_path = index_dir / (BUNDLE_FILE + ".docs.tmp")
+        self._docs = open(self.spool_path, "w+b")
+        self.sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self.doc_ranges = array("q")
+        self.columns = {name: array(self._TYPECODES[dtype]) for name, dtype in CHUNK_COLUMNS.items()}
+
+    @property
+    def count(self) -> int:
+        return len(self.columns["source_ids"])
+
+    def begin_document(self, name: str):
+        self._source_index[name] = len(self.sources)
+        self.sources.append(name)
+        self.doc_ranges.extend((self._docs.tell(), self._docs.tell()))
+
+    def write_piece(self, piece: str) -> str:
+        self._docs.write(piece.encode("utf-8"))
+        return piece
+
+    def end_document(self):
+        self.doc_ranges[-1] = self._docs.tell()
+
+    def text(self, meta: Dict) -> str:
+        """Relit le texte d'un chunk dans le fichier temporaire"""
+        doc_start = self.doc_ranges[2 * self._source_index[meta["source"]]]
+        self._docs.seek(doc_start + meta["text_start"])
+        data = self._docs.read(meta["text_end"] - meta["text_start"])
+        self._docs.seek(0, 2)
+        return str(data, "utf-8")
+
+    def write(self, metadata: List[Dict]):
+        for meta in metadata:
+            self.columns["source_ids"].append(self._source_index[meta["source"]])
+            for name in list(CHUNK_COLUMNS)[1:]:
+                self.columns[name].append(meta["chunk_id" if name == "chunk_ids" else name])
+
+    def close(self, index, config: Dict) -> int:
+        self._docs.seek(0)
+
+        writer = BundleWriter(self.bundle_path)
+        try:
+            writer.begin_section("index")
+            writer.write(faiss.serialize_index(index).tobytes())
+
+            writer.begin_section("docs")
+            for block in iter(lambda: self._docs.read(1 << 20), b""):
+                writer.write(block)
+
+            writer.add_array("doc_ranges", np.frombuffer(self.doc_ranges, dtype="int64"))
+            for name, dtype in CHUNK_COLUMNS.items():
+                writer.add_array(name, np.frombuffer(self.columns[name], dtype=dtype))
+
+            return writer.close({
+                "num_chunks": self.count,
+                "sources": self.sources,
+                "doc_keys": [doc_key_for(name) for name in self.sources],
+                "config": config
+            })
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            self._docs.close()
+            self.spool_path.unlink(missing_ok=True)
 
 
 class DocumentProcessor:
@@ -32,121 +164,429 @@ class DocumentProcessor:
         md_dir: str = "./md_files",
         index_dir: str = "./vector_db",
         chunk_size: int = 500,
-        overlap_sentences: int = 2
+        overlap_sentences: int = 2,
+        chunking_mode: str = "words",
+        overlap_tokens: int = 32,
+        extraction_workers: int = 1,
+        pages_per_task: int = 16,
+        use_embedding_cache: bool = True,
+        use_lexical_index: bool = True,
+        use_sentence_index: bool = False,
+        neighbour_k: Optional[int] = 5,
+        index_type: str = "flat",
+        nlist: int = 256,
+        nprobe: int = 16,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        ef_search: int = 64,
+        pq_m: int = 16,
+        pq_nbits: int = 8,
+        train_size: int = 20000,
+        mmap_index: bool = False
     ):
+        if chunking_mode not in CHUNKING_MODES:
+            raise ValueError(f"chunking_mode inconnu : {chunking_mode} (attendu : {', '.join(CHUNKING_MODES)})")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type inconnu : {index_type} (attendu : {', '.join(INDEX_TYPES)})")
+
         self.pdf_dir = Path(pdf_dir)
         self.md_dir = Path(md_dir)
         self.index_dir = Path(index_dir)
         self.chunk_size = chunk_size
         self.overlap_sentences = overlap_sentences
+        # "words" : chunk_size mots, overlap en phrases
+        # "tokens" : longueur mesurée par le tokenizer de l'embedder, bornée
+        #            par max_seq_length, overlap en tokens
+        self.chunking_mode = chunking_mode
+        self.overlap_tokens = overlap_tokens
+        self.extraction_workers = extraction_workers
+        self.pages_per_task = pages_per_task
+        self.extraction_stats: Dict = {}
+
+        # Configuration de l'index (flat exact ou approximatif IVF / HNSW / PQ)
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.train_size = train_size
+
+        # Chargement mmap : index FAISS et textes de chunks lus à la demande
+        self.mmap_index = mmap_index
+        self.index_mmapped = False
 
         self.md_dir.mkdir(parents=True, exist_ok=True)
         self.index_dir.mkdir(parents=True, exist_ok=True)
 
         print("Chargement du modèle d'embedding...")
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedding_model = EMBEDDING_MODEL
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
         print("Modèle chargé")
 
-        self.documents: List[str] = []
-        self.metadata: List[Dict] = []
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = EmbeddingCache(
+                self.index_dir / "embedding_cache",
+                self.embedding_model,
+                self.embedder.get_sentence_embedding_dimension()
+            )
+
+        # Table de chunks en colonnes, alignée sur les positions de l'index
+        self.chunks = ChunkStore.empty()
         self.index = None
+        # Version du bundle courant (CRC de l'en-tête), None avant sauvegarde/chargement
+        self.kb_version: Optional[int] = None
+
+        # Index lexical BM25 (recherche hybride), reconstruit à chaque sauvegarde
+        self.use_lexical_index = use_lexical_index
+        self.lexical_index: Optional[BM25Index] = None
+
+        # Sous-index de phrases (extraits ciblés), optionnel : un embedding par phrase
+        self.use_sentence_index = use_sentence_index
+        self.sentence_index: Optional[SentenceIndex] = None
+
+        # Voisins de chaque chunk (séquentiels + neighbour_k sémantiques), None : désactivé
+        self.neighbour_k = neighbour_k
+        self.neighbour_table: Optional[NeighbourTable] = None
+
+    @property
+    def documents(self) -> Sequence[str]:
+        """Textes des chunks, découpés à la demande dans les documents"""
+        return self.chunks.texts
 
     # --------------------------------------------------
     # ÉTAPE 1 : Extraction PDF → Markdown
     # --------------------------------------------------
-    def extract_pdfs_to_md(self) -> Dict[str, str]:
+    def extract_pdfs_to_md(self, pdf_files: Optional[List[Path]] = None) -> Dict[str, str]:
         md_contents = {}
-        pdf_files = list(self.pdf_dir.glob("*.pdf"))
+        if pdf_files is None:
+            pdf_files = sorted(self.pdf_dir.glob("*.pdf"))
 
         if not pdf_files:
             print("Aucun PDF trouvé")
             return md_contents
 
+        start = time.time()
+
+        if self.extraction_workers > 1:
+            pages_by_file = self._extract_parallel(pdf_files)
+        else:
+            pages_by_file = {}
+            for pdf_file in pdf_files:
+                try:
+                    pages_by_file[pdf_file] = _extract_page_range(str(pdf_file))
+                except Exception as e:
+                    print(f"Erreur avec {pdf_file.name} : {e}")
+
+        # Fusion dans l'ordre des fichiers (trié) → chunk ids stables
+        total_pages = 0
         for pdf_file in pdf_files:
-            try:
-                reader = PdfReader(pdf_file)
-                md_text = f"# {pdf_file.stem}\n\n"
+            if pdf_file not in pages_by_file:
+                continue
+
+            pages = pages_by_file[pdf_file]
+            md_text = f"# {pdf_file.stem}\n\n" + "".join(pages)
 
-                for page_num, page in enumerate(reader.pages, start=1):
-                    text = page.extract_text() or ""
-                    text = re.sub(r'\s+', ' ', text).strip()
-                    md_text += f"## Page {page_num}\n\n{text}\n\n"
+            md_path = self.md_dir / f"{pdf_file.stem}.md"
+            md_path.write_text(md_text, encoding="utf-8")
 
-                md_path = self.md_dir / f"{pdf_file.stem}.md"
-                md_path.write_text(md_text, encoding="utf-8")
+            md_contents[pdf_file.stem] = md_text
+            total_pages += len(pages)
+            print(f"{pdf_file.name} : {len(pages)} pages extraites")
 
-                md_contents[pdf_file.stem] = md_text
-                print(f"{pdf_file.name} : {len(reader.pages)} pages extraites")
+        elapsed = time.time() - start
+        self.extraction_stats = {
+            "files": len(md_contents),
+            "pages": total_pages,
+            "seconds": elapsed,
+            "pages_per_sec": total_pages / elapsed if elapsed > 0 else 0.0,
+            "workers": max(1, self.extraction_workers)
+        }
+        print(
+            f"Extraction : {total_pages} pages en {elapsed:.2f}s "
+            f"({self.extraction_stats['pages_per_sec']:.1f} pages/s, "
+            f"{self.extraction_stats['workers']} worker(s))"
+        )
+
+        return md_contents
 
+    def _extract_parallel(self, pdf_files: List[Path]) -> Dict[Path, List[str]]:
+        """
+        Extraction multi-processus : une tâche par fichier, découpée en
+        plages de `pages_per_task` pages pour les gros PDFs.
+        """
+        tasks = []
+        for pdf_file in pdf_files:
+            try:
+                num_pages = len(PdfReader(pdf_file).pages)
             except Exception as e:
                 print(f"Erreur avec {pdf_file.name} : {e}")
+                continue
 
-        return md_contents
+            step = max(1, self.pages_per_task)
+            for page_start in range(0, max(num_pages, 1), step):
+                tasks.append((pdf_file, page_start, page_start + step))
+
+        ranges: Dict[Path, Dict[int, List[str]]] = {}
+        failed = set()
+
+        with ProcessPoolExecutor(max_workers=self.extraction_workers) as pool:
+            futures = {
+                pool.submit(_extract_page_range, str(pdf_file), page_start, page_end): (pdf_file, page_start)
+                for pdf_file, page_start, page_end in tasks
+            }
+            for future, (pdf_file, page_start) in futures.items():
+                try:
+                    ranges.setdefault(pdf_file, {})[page_start] = future.result()
+                except Exception as e:
+                    if pdf_file not in failed:
+                        print(f"Erreur avec {pdf_file.name} : {e}")
+                    failed.add(pdf_file)
+
+        return {
+            pdf_file: [page for page_start in sorted(parts) for page in parts[page_start]]
+            for pdf_file, parts in ranges.items()
+            if pdf_file not in failed
+        }
 
     # --------------------------------------------------
     # ÉTAPE 2 : Chunking sémantique par phrases
     # --------------------------------------------------
-    def chunk_documents(self, md_contents: Dict[str, str]) -> Tuple[List[str], List[Dict]]:
-        documents = []
-        metadata = []
+    def chunk_documents(self, md_contents: Dict[str, str]) -> ChunkStore:
+        self.chunks = self._chunk_sources(md_contents)
+        return self.chunks
 
-        for filename, text in md_contents.items():
-            chunks = self._chunk_text(text)
+    def _chunk_sources(self, md_contents: Dict[str, str]) -> ChunkStore:
+        """Découpe les documents en spans : le texte des chunks n'est pas recopié"""
+        store = ChunkStore.empty()
 
-            for i, chunk in enumerate(chunks):
-                documents.append(chunk)
-                metadata.append({
-                    "source": filename,
-                    "chunk_id": i,
-                    "length_tokens": len(chunk.split())
-                })
+        for filename, text in md_contents.items():
+            store.add_document(filename, text)
+            metadata = [
+                self._chunk_meta(filename, i, span)
+                for i, span in enumerate(self._iter_chunks([text]))
+            ]
+            store.append(metadata)
 
-            print(f"{filename} : {len(chunks)} chunks")
+            print(f"{filename} : {len(metadata)} chunks")
 
-        self.documents = documents
-        self.metadata = metadata
-        return documents, metadata
+        return store
 
     def _chunk_text(self, text: str) -> List[str]:
         """
         Chunking sémantique basé sur les phrases
         """
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        data = text.encode("utf-8")
+        return [str(data[span[0]:span[1]], "utf-8") for span in self._iter_chunks([text])]
 
-        chunks = []
-        current_chunk = []
+    @staticmethod
+    def _chunk_meta(source: str, chunk_id: int, span: Tuple[int, int, int, int, int]) -> Dict:
+        text_start, text_end, token_start, token_end, page = span
+        return {
+            "source": source,
+            "chunk_id": chunk_id,
+            "length_tokens": token_end - token_start,
+            "token_start": token_start,
+            "token_end": token_end,
+            "text_start": text_start,
+            "text_end": text_end,
+            "page": page
+        }
+
+    def _chunk_limit(self) -> int:
+        if self.chunking_mode == "tokens":
+            # [CLS] + [SEP] : au-delà, l'embedder tronque
+            return min(self.chunk_size, self.embedder.max_seq_length - 2)
+        return self.chunk_size
+
+    def _iter_chunks(self, pieces: Iterable[str]) -> Iterator[Tuple[int, int, int, int, int]]:
+        """
+        Version générateur du chunking : consomme le texte morceau par morceau
+        (ex. page par page) et produit les mêmes chunks que sur le texte complet.
+        Produit des spans (début, fin en octets UTF-8 dans le document ;
+        début, fin en mots ou en tokens selon chunking_mode ; page du début).
+        """
+        limit = self._chunk_limit()
+        # En-têtes "## Page N" rencontrés : offset en octets → numéro de page
+        page_offsets: List[int] = []
+        page_numbers: List[int] = []
+
+        def tracked(pieces: Iterable[str]) -> Iterator[str]:
+            offset = 0
+            for piece in pieces:
+                position, consumed = 0, offset
+                for match in PAGE_HEADER.finditer(piece):
+                    consumed += len(piece[position:match.start()].encode("utf-8"))
+                    position = match.start()
+                    page_offsets.append(consumed)
+                    page_numbers.append(int(match.group(1)))
+                offset += len(piece.encode("utf-8"))
+                yield piece
+
+        current_chunk = []  # (longueur, début, fin en octets, position de début)
         current_length = 0
+        position = 0
+
+        for length, start, end in self._iter_measured_sentences(tracked(pieces), limit):
+            if current_length + length > limit and current_chunk:
+                yield self._emit_chunk(current_chunk, page_offsets, page_numbers)
+
+                current_chunk = self._overlap_window(current_chunk, limit - length)
+                current_length = sum(item[0] for item in current_chunk)
+
+            current_chunk.append((length, start, end, position))
+            current_length += length
+            position += length
+
+        if current_chunk:
+            yield self._emit_chunk(current_chunk, page_offsets, page_numbers)
+
+    @staticmethod
+    def _emit_chunk(
+        current_chunk: List[Tuple[int, int, int, int]],
+        page_offsets: List[int],
+        page_numbers: List[int]
+    ) -> Tuple[int, int, int, int, int]:
+        (_, text_start, _, token_start), (last_length, _, text_end, last_position) = current_chunk[0], current_chunk[-1]
+
+        i = bisect_right(page_offsets, text_start)
+        if i:
+            page = page_numbers[i - 1]
+        else:
+            # Chunk commençant avant le premier en-tête (titre du document)
+            page = page_numbers[0] if page_offsets and page_offsets[0] < text_end else 0
+
+        return text_start, text_end, token_start, last_position + last_length, page
+
+    def _overlap_window(self, current_chunk: List[Tuple[int, int, int, int]], room: int) -> List[Tuple[int, int, int, int]]:
+        if self.chunking_mode == "words":
+            # overlap : conserver les dernières phrases
+            return current_chunk[-self.overlap_sentences:] if self.overlap_sentences else []
+
+        # overlap : dernières phrases tenant dans overlap_tokens et dans la
+        # place laissée par la phrase suivante (le chunk ne dépasse jamais la limite)
+        budget = min(self.overlap_tokens, room)
+        window, total = [], 0
+        for item in reversed(current_chunk):
+            if total + item[0] > budget:
+                break
+            window.insert(0, item)
+            total += item[0]
+        return window
+
+    def _iter_measured_sentences(self, pieces: Iterable[str], limit: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        Phrases mesurées : (longueur, début, fin en octets). Longueur en mots,
+        ou en tokens de l'embedder (tokenizer appelé par lots de 64 phrases).
+        """
+        sentences = self._iter_sentences(pieces)
+
+        if self.chunking_mode == "words":
+            for sentence, start, end in sentences:
+                yield len(sentence.split()), start, end
+            return
+
+        tokenizer = self.embedder.tokenizer
+        while True:
+            batch = list(islice(sentences, 64))
+            if not batch:
+                return
+
+            token_ids = tokenizer([sentence for sentence, _, _ in batch], add_special_tokens=False)["input_ids"]
+            for (sentence, start, end), ids in zip(batch, token_ids):
+                if len(ids) > limit:
+                    yield from self._split_long_sentence(sentence, start, limit)
+                else:
+                    yield len(ids), start, end
+
+    def _split_long_sentence(self, sentence: str, start: int, limit: int) -> Iterator[Tuple[int, int, int]]:
+        """Découpe une phrase plus longue que la fenêtre du modèle en segments de mots"""
+        words = list(re.finditer(r'\S+', sentence))
+        counts = [
+            len(ids) for ids in
+            self.embedder.tokenizer([word.group() for word in words], add_special_tokens=False)["input_ids"]
+        ]
+
+        offset, position = start, 0
+        segment_start, segment_end, length = None, start, 0
+        for word, count in zip(words, counts):
+            word_start = offset + len(sentence[position:word.start()].encode("utf-8"))
+            offset, position = word_start + len(word.group().encode("utf-8")), word.end()
+
+            if length + count > limit and segment_start is not None:
+                yield length, segment_start, segment_end
+                segment_start, length = None, 0
+            if segment_start is None:
+                segment_start = word_start
+            segment_end = offset
+            length += count
 
-        for sentence in sentences:
-            tokens = len(sentence.split())
+        if segment_start is not None:
+            yield length, segment_start, segment_end
 
-            if current_length + tokens <= self.chunk_size:
-                current_chunk.append(sentence)
-                current_length += tokens
+    @staticmethod
+    def _iter_sentences(pieces: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+        """
+        Découpage en phrases sur un flux de morceaux de texte.
+        La dernière phrase (potentiellement incomplète) est retenue jusqu'au
+        morceau suivant ; après une frontière de phrase, les blancs en tête du
+        morceau suivant appartiennent au même séparateur.
+        Produit (phrase, début, fin) : offsets en octets UTF-8 dans le document.
+        """
+        carry = ""
+        carry_start = 0
+        offset = 0
+        at_boundary = False
+
+        for piece in pieces:
+            piece_start = offset
+            offset += len(piece.encode("utf-8"))
+
+            if at_boundary:
+                buffer = piece.lstrip()
+                start = piece_start + len(piece[:len(piece) - len(buffer)].encode("utf-8"))
             else:
-                chunks.append(" ".join(current_chunk))
+                buffer = carry + piece
+                start = carry_start
+            if not buffer:
+                continue
 
-                # overlap : conserver les dernières phrases
-                current_chunk = current_chunk[-self.overlap_sentences:]
-                current_length = sum(len(s.split()) for s in current_chunk)
+            position = 0
+            for match in SENTENCE_SPLIT.finditer(buffer):
+                end = start + len(buffer[position:match.start()].encode("utf-8"))
+                yield buffer[position:match.start()], start, end
+                start = end + len(match.group().encode("utf-8"))
+                position = match.end()
 
-                current_chunk.append(sentence)
-                current_length += tokens
+            carry, carry_start = buffer[position:], start
+            at_boundary = carry == ""
 
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
+        if carry:
+            yield carry, carry_start, carry_start + len(carry.encode("utf-8"))
 
-        return chunks
+    def _iter_sentence_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Spans des phrases d'un document, telles que mesurées par le chunking"""
+        for _, start, end in self._iter_measured_sentences([text], self._chunk_limit()):
+            yield start, end
 
     # --------------------------------------------------
     # ÉTAPE 3 : Embeddings
     # --------------------------------------------------
-    def create_embeddings(self) -> np.ndarray:
-        if not self.documents:
+    def create_embeddings(self, texts: Optional[List[str]] = None) -> np.ndarray:
+        if texts is None:
+            texts = self.documents
+
+        if not texts:
             return np.array([])
 
+        if self.embedding_cache is not None:
+            return self.embedding_cache.encode(texts, self.embedder, batch_size=32, show_progress_bar=True)
+
         embeddings = self.embedder.encode(
-            self.documents,
+            texts,
             convert_to_numpy=True,
             show_progress_bar=True,
             batch_size=32
@@ -164,48 +604,357 @@ class DocumentProcessor:
         # Normalisation L2 → cosine similarity
         faiss.normalize_L2(embeddings)
 
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
+        self.index = self._create_index(embeddings.shape[1], len(embeddings))
+        if not self.index.is_trained:
+            self.index.train(embeddings)
+        self.index.add(embeddings)
+        self._apply_search_params()
+
+        print(f"Index FAISS créé ({self.index_type}) : {self.index.ntotal} vecteurs")
+
+    def _create_index(self, dimension: int, num_vectors: int) -> faiss.Index:
+        """
+        Fabrique d'index FAISS (produit scalaire sur vecteurs normalisés) :
+        - flat     : recherche exacte (brute force)
+        - ivf_flat : partitionnement k-means en `nlist` listes, `nprobe` listes visitées
+        - hnsw     : graphe HNSW (`hnsw_m` voisins, `ef_search` à la requête)
+        - ivf_pq   : IVF + quantification produit (`pq_m` sous-vecteurs de `pq_nbits` bits)
+        """
+        metric = faiss.METRIC_INNER_PRODUCT
+
+        if self.index_type == "flat":
+            return faiss.IndexFlatIP(dimension)
+
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, self.hnsw_m, metric)
+            index.hnsw.efConstruction = self.ef_construction
+            return index
+
+        # FAISS recommande ~39 points d'entraînement par liste
+        nlist = max(1, min(self.nlist, num_vectors // 39))
+        quantizer = faiss.IndexFlatIP(dimension)
+
+        if self.index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+
+        pq_m = self.pq_m
+        while dimension % pq_m:
+            pq_m -= 1
+        # 2^nbits centroïdes par sous-quantifieur, même règle des ~39 points par centroïde
+        nbits = max(1, min(self.pq_nbits, int(np.log2(max(num_vectors // 39, 2)))))
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, nbits, metric)
+
+    def _apply_search_params(self):
+        """Applique nprobe / efSearch (non garantis par la sérialisation)"""
+        index = self.index
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = min(self.nprobe, index.nlist)
+        elif isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+
+    def _start_trained_index(self, embeddings: np.ndarray):
+        """Crée, entraîne et remplit l'index à partir d'un premier lot (ingestion en flux)"""
+        self.index = self._create_index(embeddings.shape[1], len(embeddings))
+        if not self.index.is_trained:
+            self.index.train(embeddings)
         self.index.add(embeddings)
+        self._apply_search_params()
+
+    def _add_embeddings(self, embeddings: np.ndarray):
+        """Ajoute des vecteurs à l'index existant (mise à jour incrémentale)"""
+        if embeddings.size == 0:
+            return
+
+        faiss.normalize_L2(embeddings)
+        self.index.add(embeddings)
+
+    def _remove_sources(self, sources: set):
+        """
+        Retire de l'index et de la table tous les chunks des sources données.
+        IndexFlat.remove_ids compacte les positions en conservant l'ordre,
+        la table de chunks reste donc alignée sur l'index. Les index
+        approximatifs ne compactent pas : ils sont reconstruits par l'appelant.
+        """
+        positions = np.flatnonzero(self.chunks.source_mask(sources))
+        if not len(positions):
+            return 0
+
+        if self.index_type == "flat":
+            self.index.remove_ids(positions.astype("int64"))
+
+        return self.chunks.drop_sources(sources)
+
+    def chunk_vectors(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Vecteurs normalisés des chunks demandés (tous par défaut), dans l'ordre
+        des positions :
+        - flat / HNSW / IVF-Flat : relus dans l'index (vecteurs en clair ;
+          IVF-Flat via sa table directe position → liste, créée une fois)
+        - IVF-PQ : vecteurs compressés, relus dans le cache d'embeddings ;
+          seuls les textes des chunks demandés sont lus et hachés
+        """
+        if positions is None:
+            positions = np.arange(self.index.ntotal)
+        positions = np.asarray(positions, dtype="int64")
+        if not len(positions):
+            return np.zeros((0, self.index.d), dtype="float32")
+
+        if self.index_type in ("flat", "hnsw", "ivf_flat"):
+            if self.index_type == "ivf_flat" and self.index.direct_map.type == faiss.DirectMap.NoMap:
+                self.index.make_direct_map()
+            return self.index.reconstruct_batch(positions)
+
+        vectors = self.create_embeddings([self.chunks.text(int(i)) for i in positions])
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def evaluate_index(self, num_queries: int = 100, k: int = 10) -> Dict:
+        """
+        Compare l'index courant à une recherche exacte (IndexFlatIP) :
+        recall@k et latence moyenne par requête.
+        Les vecteurs viennent du cache d'embeddings (pas de ré-encodage).
+        """
+        if self.index is None or not self.documents:
+            return {}
+
+        vectors = self.create_embeddings()
+        faiss.normalize_L2(vectors)
+
+        baseline = faiss.IndexFlatIP(vectors.shape[1])
+        baseline.add(vectors)
 
-        print(f"Index FAISS créé : {self.index.ntotal} vecteurs")
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+        queries = vectors[sample]
+        k = min(k, len(vectors))
+
+        def timed_search(index):
+            start = time.perf_counter()
+            ids = [index.search(queries[i:i + 1], k)[1][0] for i in range(len(queries))]
+            return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+        truth, flat_ms = timed_search(baseline)
+        found, index_ms = timed_search(self.index)
+
+        recall = float(np.mean([
+            len(set(t.tolist()) & set(f.tolist())) / k for t, f in zip(truth, found)
+        ]))
+
+        report = {
+            "index_type": self.index_type,
+            "queries": len(queries),
+            f"recall@{k}": recall,
+            "latency_ms_flat": flat_ms,
+            "latency_ms_index": index_ms,
+            "speedup": flat_ms / index_ms if index_ms > 0 else 0.0
+        }
+        print(
+            f"Index {self.index_type} : recall@{k} = {recall:.3f}, "
+            f"{index_ms:.3f} ms/requête (flat : {flat_ms:.3f} ms, x{report['speedup']:.1f})"
+        )
+        return report
+
+    def _chunking_config(self) -> Dict:
+        return {
+            "chunk_size": self.chunk_size,
+            "overlap_sentences": self.overlap_sentences,
+            "chunking_mode": self.chunking_mode,
+            "overlap_tokens": self.overlap_tokens
+        }
+
+    def _bundle_config(self) -> Dict:
+        return {
+            **self._chunking_config(),
+            "index_type": self.index_type,
+            "nprobe": self.nprobe,
+            "ef_search": self.ef_search
+        }
 
     # --------------------------------------------------
     # Sauvegarde / Chargement
     # --------------------------------------------------
-    def save_index(self):
+    def save_index(self, keep: Optional[np.ndarray] = None):
+        """
+        keep : chunks conservés par une ré-indexation incrémentale (masque sur
+        les anciennes positions, nouveaux chunks en fin de table) ; les index
+        dérivés sont alors mis à jour au lieu d'être reconstruits
+        """
         if self.index is None:
             return
 
-        faiss.write_index(self.index, str(self.index_dir / "doxa_kb.index"))
-
-        with open(self.index_dir / "metadata.json", "w", encoding="utf-8") as f:
-            json.dump({
-                "documents": self.documents,
-                "metadata": self.metadata,
-                "chunk_size": self.chunk_size,
-                "overlap_sentences": self.overlap_sentences
-            }, f, ensure_ascii=False, indent=2)
+        # Bundle unique (index + documents + table de chunks), écriture atomique
+        self.kb_version = write_bundle(self.index_dir / BUNDLE_FILE, self.index, self.chunks, self._bundle_config())
 
         print("Index et métadonnées sauvegardés")
+        if keep is None:
+            self._load_derived_indexes(rebuild=True)
+        else:
+            self._update_derived_indexes(keep)
 
-    def load_index(self) -> bool:
-        index_path = self.index_dir / "doxa_kb.index"
-        meta_path = self.index_dir / "metadata.json"
+    def load_index(self, mmap: Optional[bool] = None, verify: bool = False) -> bool:
+        """
+        Charge le bundle de la KB après validation (en-tête, CRC, cohérence).
+        mmap=True : l'index FAISS est mappé en mémoire (lecture seule) quand
+        son type le permet. La table de chunks et les textes sont toujours
+        lus à la demande depuis le bundle mappé.
+        verify=True : vérifie aussi le CRC de l'index et des textes.
+        """
+        bundle_path = self.index_dir / BUNDLE_FILE
+        if not bundle_path.exists():
+            return False
 
-        if not index_path.exists() or not meta_path.exists():
+        if mmap is None:
+            mmap = self.mmap_index
+
+        try:
+            bundle = KBBundle(bundle_path, verify=verify)
+            index, self.index_mmapped = bundle.read_index(mmap_index=mmap)
+        except (ValueError, RuntimeError) as e:
+            print(f"Bundle illisible ({e}) : reconstruction nécessaire")
+            return False
+
+        if index.ntotal != bundle.num_chunks:
+            print(f"Bundle incohérent ({index.ntotal} vecteurs pour {bundle.num_chunks} chunks)")
             return False
 
-        self.index = faiss.read_index(str(index_path))
+        self.index = index
+        self.chunks = bundle.chunk_store()
+        self.kb_version = bundle.checksum
+
+        # Le type réellement sauvegardé prime sur la configuration courante
+        stored_type = bundle.config.get("index_type", "flat")
+        if stored_type != self.index_type:
+            print(f"Index sauvegardé de type {stored_type} (configuré : {self.index_type})")
+            self.index_type = stored_type
+        self._apply_search_params()
 
-        with open(meta_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            self.documents = data["documents"]
-            self.metadata = data["metadata"]
+        mode = ", mmap" if self.index_mmapped else ""
+        print(f"Index chargé ({self.index_type}{mode}) : {self.index.ntotal} vecteurs")
 
-        print(f"Index chargé : {self.index.ntotal} vecteurs")
+        self._load_derived_indexes()
         return True
 
+    def _derived_indexes(self) -> List[Tuple[str, str, str, Callable, Callable, Callable]]:
+        """
+        Index dérivés actifs : (attribut, fichier, libellé, lecture,
+        construction, mise à jour incrémentale à partir du masque `keep`)
+        """
+        new_positions = lambda keep: range(int(keep.sum()), len(self.chunks))
+        derived = []
+
+        if self.use_lexical_index:
+            derived.append((
+                "lexical_index", LEXICAL_FILE, "Index lexical BM25",
+                BM25Index.load,
+                lambda: BM25Index.build(self.chunks.texts),
+                lambda index, keep: index.update(keep, (self.chunks.text(i) for i in new_positions(keep)))
+            ))
+
+        if self.use_sentence_index:
+            # Embeddings des phrases via le cache, par lots
+            derived.append((
+                "sentence_index", SENTENCE_FILE, "Index de phrases",
+                lambda path: SentenceIndex.load(path, self.chunks),
+                lambda: SentenceIndex.build(self.chunks, self._iter_sentence_spans, self.create_embeddings),
+                lambda index, keep: index.update(self.chunks, keep, self._iter_sentence_spans, self.create_embeddings)
+            ))
+
+        if self.neighbour_k is not None and len(self.chunks):
+            # Voisins cherchés dans l'index de la KB, vecteurs relus par lots
+            search = lambda queries, n: self.index.search(queries, n)
+            derived.append((
+                "neighbour_table", NEIGHBOUR_FILE, "Table des voisins",
+                NeighbourTable.load,
+                lambda: NeighbourTable.build(self.chunks, self.chunk_vectors, search, self.neighbour_k),
+                lambda table, keep: table.update(self.chunks, keep, self.chunk_vectors, search)
+            ))
+
+        return derived
+
+    def _load_derived_indexes(self, rebuild: bool = False):
+        """
+        Index dérivés du bundle, chacun dans son fichier à côté : relus s'ils
+        correspondent à la version du bundle, reconstruits sinon
+        """
+        for attribute, filename, label, load, build, _ in self._derived_indexes():
+            setattr(self, attribute, self._load_derived(filename, label, load, build, rebuild))
+
+    def _update_derived_indexes(self, keep: np.ndarray):
+        """
+        Après ré-indexation incrémentale : seules les lignes touchées sont
+        recalculées (construction complète si l'index dérivé n'existait pas)
+        """
+        for attribute, filename, label, _, build, update in self._derived_indexes():
+            current = getattr(self, attribute)
+            start = time.time()
+            index = build() if current is None else update(current, keep)
+            index.save(self.index_dir / filename, self.kb_version)
+            setattr(self, attribute, index)
+            mode = "construction" if current is None else "mise à jour incrémentale"
+            print(f"{label} : {index.summary()} en {time.time() - start:.2f}s ({mode})")
+
+    def _load_derived(self, filename: str, label: str, load: Callable, build: Callable, rebuild: bool):
+        path = self.index_dir / filename
+        if not rebuild and path.exists():
+            try:
+                index, kb_version = load(path)
+                if kb_version == self.kb_version:
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"{label} illisible ({e}) : reconstruction")
+
+        start = time.time()
+        index = build()
+        index.save(path, self.kb_version)
+        print(f"{label} : {index.summary()} en {time.time() - start:.2f}s")
+        return index
+
+    # --------------------------------------------------
+    # Manifest (hash par fichier source)
+    # --------------------------------------------------
+    def _manifest_entry(self, pdf_file: Path, num_chunks: int) -> Dict:
+        md_path = self.md_dir / f"{pdf_file.stem}.md"
+        return {
+            "pdf": pdf_file.name,
+            "pdf_sha256": _file_sha256(pdf_file),
+            "md_sha256": _file_sha256(md_path) if md_path.exists() else None,
+            "num_chunks": num_chunks
+        }
+
+    def _build_manifest(self, pdf_files: List[Path]) -> Dict:
+        counts = self.chunks.source_counts()
+
+        return {
+            "version": MANIFEST_VERSION,
+            **self._chunking_config(),
+            "files": {
+                pdf_file.stem: self._manifest_entry(pdf_file, counts.get(pdf_file.stem, 0))
+                for pdf_file in pdf_files
+                if pdf_file.stem in counts
+            }
+        }
+
+    def save_manifest(self, manifest: Dict):
+        manifest_path = self.index_dir / "manifest.json"
+        tmp_path = manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(manifest_path)
+
+    def load_manifest(self) -> Optional[Dict]:
+        manifest_path = self.index_dir / "manifest.json"
+        if not manifest_path.exists():
+            return None
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != MANIFEST_VERSION or any(
+            manifest.get(key) != value for key, value in self._chunking_config().items()
+        ):
+            return None
+
+        return manifest
+
     # --------------------------------------------------
     # Pipeline complet
     # --------------------------------------------------
@@ -218,8 +967,183 @@ class DocumentProcessor:
         embeddings = self.create_embeddings()
         self.build_index(embeddings)
         self.save_index()
+        self.save_manifest(self._build_manifest(sorted(self.pdf_dir.glob("*.pdf"))))
         self.test_similarity()
 
+    def process_streaming(self, batch_size: int = 256):
+        """
+        Ingestion en flux à mémoire bornée :
+        pages PDF → phrases → chunks → embeddings par batch → index FAISS
+        + bundle de la KB écrit au fil de l'eau.
+        Seuls une page, le chunk en cours et un batch sont en mémoire.
+        """
+        pdf_files = sorted(self.pdf_dir.glob("*.pdf"))
+        if not pdf_files:
+            print("Aucun PDF trouvé")
+            return
+
+        start = time.time()
+        dimension = self.embedder.get_sentence_embedding_dimension()
+        self.index = None
+        if self.index_type in ("flat", "hnsw"):
+            self.index = self._create_index(dimension, 0)
+            self._apply_search_params()
+
+        writer = _BundleSpool(self.index_dir)
+        batch_meta: List[Dict] = []
+        manifest_files = {}
+        # IVF : les premiers vecteurs (≤ train_size) sont retenus pour l'entraînement
+        pending: List[np.ndarray] = []
+
+        def flush():
+            embeddings = self.create_embeddings([writer.text(meta) for meta in batch_meta])
+            faiss.normalize_L2(embeddings)
+            writer.write(batch_meta)
+            batch_meta.clear()
+
+            if self.index is not None:
+                self.index.add(embeddings)
+                return
+
+            pending.append(embeddings)
+            if sum(len(e) for e in pending) >= self.train_size:
+                self._start_trained_index(np.vstack(pending))
+                pending.clear()
+
+        for pdf_file in pdf_files:
+            writer.begin_document(pdf_file.stem)
+            try:
+                # Chaque page est écrite dans le fichier temporaire avant d'être découpée
+                pieces = map(writer.write_piece, self._iter_pdf_pieces(pdf_file))
+                num_chunks = 0
+
+                for chunk_id, span in enumerate(self._iter_chunks(pieces)):
+                    batch_meta.append(self._chunk_meta(pdf_file.stem, chunk_id, span))
+                    num_chunks += 1
+
+                    if len(batch_meta) >= batch_size:
+                        flush()
+
+            except Exception as e:
+                print(f"Erreur avec {pdf_file.name} : {e}")
+                continue
+            finally:
+                writer.end_document()
+
+            manifest_files[pdf_file.stem] = self._manifest_entry(pdf_file, num_chunks)
+            print(f"{pdf_file.stem} : {num_chunks} chunks")
+
+        if batch_meta:
+            flush()
+        if self.index is None:
+            if pending:
+                self._start_trained_index(np.vstack(pending))
+            else:
+                self.index = faiss.IndexFlatIP(dimension)
+
+        writer.close(self.index, self._bundle_config())
+        self.save_manifest({
+            "version": MANIFEST_VERSION,
+            **self._chunking_config(),
+            "files": manifest_files
+        })
+
+        print(f"Ingestion en flux : {writer.count} chunks indexés en {time.time() - start:.2f}s")
+        self.load_index()
+
+    def _iter_pdf_pieces(self, pdf_file: Path) -> Iterator[str]:
+        """Produit le Markdown d'un PDF page par page en l'écrivant sur disque"""
+        reader = PdfReader(pdf_file)
+
+        with open(self.md_dir / f"{pdf_file.stem}.md", "w", encoding="utf-8") as md_file:
+            piece = f"# {pdf_file.stem}\n\n"
+            md_file.write(piece)
+            yield piece
+
+            for page_num, page in enumerate(reader.pages, start=1):
+                piece = _format_page(page_num, page.extract_text() or "")
+                md_file.write(piece)
+                yield piece
+
+    def process_incremental(self) -> Dict[str, List[str]]:
+        """
+        Ré-indexation incrémentale : seuls les fichiers ajoutés, modifiés ou
+        supprimés depuis le dernier build sont extraits, découpés et encodés.
+        Bascule sur un rebuild complet si l'index ou le manifest est absent
+        (ou si la configuration de chunking a changé).
+        """
+        manifest = self.load_manifest()
+        if manifest is None or (self.index is None and not self.load_index()):
+            print("Manifest absent ou obsolète : reconstruction complète")
+            self.process()
+            return {"added": [], "changed": [], "removed": [], "rechunked": []}
+
+        start = time.time()
+        known = manifest["files"]
+        pdf_files = {p.stem: p for p in sorted(self.pdf_dir.glob("*.pdf"))}
+
+        added, changed, rechunked = [], [], []
+        for stem, pdf_file in pdf_files.items():
+            entry = known.get(stem)
+            if entry is None:
+                added.append(stem)
+                continue
+
+            if _file_sha256(pdf_file) != entry["pdf_sha256"]:
+                changed.append(stem)
+                continue
+
+            # PDF inchangé : le Markdown a pu être corrigé à la main
+            md_path = self.md_dir / f"{stem}.md"
+            if not md_path.exists():
+                changed.append(stem)
+            elif _file_sha256(md_path) != entry["md_sha256"]:
+                rechunked.append(stem)
+
+        removed = [stem for stem in known if stem not in pdf_files]
+        summary = {"added": added, "changed": changed, "removed": removed, "rechunked": rechunked}
+
+        if not (added or changed or removed or rechunked):
+            print("Index à jour : aucun fichier modifié")
+            return summary
+
+        # Un index mappé en mémoire est en lecture seule : rechargement modifiable
+        if self.index_mmapped:
+            self.load_index(mmap=False)
+
+        stale = set(added + changed + removed + rechunked)
+        keep = ~self.chunks.source_mask(stale)
+        removed_chunks = self._remove_sources(stale)
+
+        md_contents = {}
+        if added or changed:
+            md_contents = self.extract_pdfs_to_md([pdf_files[stem] for stem in added + changed])
+        for stem in rechunked:
+            md_contents[stem] = (self.md_dir / f"{stem}.md").read_text(encoding="utf-8")
+
+        new_chunks = self._chunk_sources(md_contents)
+        embeddings = self.create_embeddings(list(new_chunks.texts))
+
+        self.chunks.extend(new_chunks)
+
+        if self.index_type == "flat":
+            self._add_embeddings(embeddings)
+        elif self.documents:
+            # IVF / HNSW : reconstruction depuis le cache, seuls les nouveaux chunks sont encodés
+            self.build_index(self.create_embeddings())
+        else:
+            self.index.reset()
+
+        self.save_index(keep)
+        self.save_manifest(self._build_manifest(list(pdf_files.values())))
+
+        print(
+            f"Mise à jour incrémentale : +{len(added)} ~{len(changed) + len(rechunked)} "
+            f"-{len(removed)} fichiers, {removed_chunks} chunks retirés, "
+            f"{len(new_chunks)} chunks encodés en {time.time() - start:.2f}s"
+        )
+        return summary
+
     # --------------------------------------------------
     # Test de similarité
     # --------------------------------------------------
@@ -236,14 +1160,14 @@ class DocumentProcessor:
 
         for idx in sample_indices:
             query = self.documents[idx]
-            query_emb = self.embedder.encode([query], convert_to_numpy=True)
+            query_emb = self.create_embeddings([query])
             faiss.normalize_L2(query_emb)
 
             score, _ = self.index.search(query_emb, k=1)
             similarity = score[0][0]
             scores.append(similarity)
 
-            print(f"Chunk {idx} ({self.metadata[idx]['source']}): {similarity:.3f}")
+            print(f"Chunk {idx} ({self.chunks.source(idx)}): {similarity:.3f}")
 
         avg = sum(scores) / len(scores)
         print(f"Similarité moyenne : {avg:.3f}")
@@ -252,13 +1176,17 @@ class DocumentProcessor:
 # --------------------------------------------------
 # Fonction utilitaire
 # --------------------------------------------------
-def create_knowledge_base(pdf_dir: str, force_rebuild: bool = False):
+def create_knowledge_base(pdf_dir: str, force_rebuild: bool = False, streaming: bool = False):
     processor = DocumentProcessor(pdf_dir)
 
     if not force_rebuild and processor.load_index():
+        processor.process_incremental()
         return processor
 
-    processor.process()
+    if streaming:
+        processor.process_streaming()
+    else:
+        processor.process()
     return processor
 
 
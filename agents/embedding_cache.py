@@ -0,0 +1,181 @@
+# agents/embedding_cache.py
+"""
+Cache persistant des embeddings de chunks
+
+Clé     : nom du modèle + SHA-1 du texte normalisé (espaces, Unicode NFC)
+Stockage: vector_db/embedding_cache/<modèle>/
+          - vectors.f32 : matrice float32 brute, lue via np.memmap
+          - keys.txt    : un hash par ligne, ligne i ↔ vecteur i (ajout seul)
+          - cache.lock  : verrou des écritures (plusieurs instances, plusieurs processus)
+"""
+
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+
+class EmbeddingCache:
+    """
+    Cache disque des embeddings, partagé par DocumentProcessor et RetrievalAgent
+    Seuls les textes absents du cache sont envoyés à l'encodeur
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dimension: int):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.dir = Path(cache_dir) / re.sub(r"[^\w.-]+", "_", model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self.vectors_path = self.dir / "vectors.f32"
+        self.keys_path = self.dir / "keys.txt"
+        self.lock_path = self.dir / "cache.lock"
+
+        self.rows: Dict[str, int] = {}
+        # Lignes de keys.txt déjà lues (doublons compris) et octets correspondants
+        self._num_rows = 0
+        self._keys_size = 0
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+
+        self._open()
+
+    @contextmanager
+    def _locked(self):
+        """Verrou exclusif sur le répertoire du cache (un descripteur par appel)"""
+        with open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _open(self):
+        with self._locked():
+            data = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+            complete = data[:data.rfind(b"\n") + 1]
+            keys = complete.decode("utf-8").split()
+
+            row_bytes = 4 * self.dimension
+            num_vectors = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+
+            # Écriture interrompue : on ne garde que les lignes complètes des deux côtés
+            num_rows = min(len(keys), num_vectors)
+            if num_rows != len(keys) or len(complete) != len(data):
+                self.keys_path.write_text("".join(k + "\n" for k in keys[:num_rows]), encoding="utf-8")
+            if self.vectors_path.exists() and self.vectors_path.stat().st_size != num_rows * row_bytes:
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(num_rows * row_bytes)
+
+            self._reset()
+            self._refresh()
+
+    def _reset(self):
+        self.rows = {}
+        self._num_rows = 0
+        self._keys_size = 0
+        self._matrix = None
+
+    def _refresh(self):
+        """
+        Lit les clés ajoutées depuis la dernière lecture, y compris par une
+        autre instance sur le même répertoire. Les clés sont écrites après
+        leurs vecteurs : toute ligne complète de keys.txt a son vecteur.
+        """
+        size = self.keys_path.stat().st_size if self.keys_path.exists() else 0
+        if size == self._keys_size:
+            return
+        if size < self._keys_size:
+            # Fichier réparé par une autre instance : relecture complète
+            self._reset()
+
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_size)
+            data = f.read(size - self._keys_size)
+        data = data[:data.rfind(b"\n") + 1]
+
+        for key in data.decode("utf-8").split():
+            # Première occurrence conservée : les lignes déjà connues ne bougent pas
+            self.rows.setdefault(key, self._num_rows)
+            self._num_rows += 1
+        self._keys_size += len(data)
+        self._matrix = None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if not self._num_rows:
+                return np.zeros((0, self.dimension), dtype="float32")
+            self._matrix = np.memmap(
+                self.vectors_path, dtype="float32", mode="r",
+                shape=(self._num_rows, self.dimension)
+            )
+        return self._matrix
+
+    @staticmethod
+    def key(text: str) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def encode(self, texts: List[str], embedder, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Équivalent de embedder.encode(texts) : lit le cache, n'encode que les
+        textes manquants et les ajoute au cache. Retourne une copie float32.
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+
+        keys = [self.key(text) for text in texts]
+        self._refresh()
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows and key not in missing:
+                missing[key] = text
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+
+        if missing:
+            embeddings = embedder.encode(
+                list(missing.values()),
+                convert_to_numpy=True,
+                show_progress_bar=show_progress_bar,
+                batch_size=batch_size
+            )
+            self._append(list(missing.keys()), np.asarray(embeddings, dtype="float32"))
+
+        return np.array(self.matrix[[self.rows[key] for key in keys]], dtype="float32")
+
+    def _append(self, keys: List[str], embeddings: np.ndarray):
+        with self._locked():
+            # Numéros de ligne pris dans les fichiers, pas dans la mémoire de
+            # cette instance : une autre a pu ajouter des lignes entre-temps
+            self._refresh()
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not new:
+                return
+
+            # Vecteurs d'abord, clés ensuite : une clé n'existe jamais sans son vecteur
+            with open(self.vectors_path, "ab") as f:
+                # Vecteurs orphelins d'une écriture interrompue
+                f.truncate(self._num_rows * 4 * self.dimension)
+                f.write(np.ascontiguousarray(embeddings[new]).tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(keys[i] + "\n" for i in new))
+
+            self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.rows)
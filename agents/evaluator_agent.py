@@ -6,21 +6,47 @@ Critère 4 (9%) : Confiance moyenne <0.6 → escalade
 """
 
 import json
+from typing import Optional
 from agno.agent import Agent
 from agno.models.mistral import MistralChat
 
+from agents.llm_cache import CachedAgent, LLMCache
+
 from dotenv import load_dotenv
 
 
 load_dotenv()
+
+# Décision :
+# - hybrid : règles pour les cas nets, LLM dans la bande d'incertitude
+# - rules  : règles seules (aucun appel réseau)
+# - llm    : LLM pour chaque ticket
+EVALUATION_MODES = ("hybrid", "rules", "llm")
+
+
 class EvaluatorAgent:
     """
     Agent d'évaluation qui décide si la réponse est suffisamment fiable
     ou si une escalade vers un humain est nécessaire
     """
     
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(
+        self,
+        llm_cache: Optional[LLMCache] = None,
+        mode: str = "hybrid",
+        threshold: float = 0.6,
+        uncertainty_band: float = 0.1
+    ):
+        if mode not in EVALUATION_MODES:
+            raise ValueError(f"mode inconnu : {mode} (attendu : {', '.join(EVALUATION_MODES)})")
+        
+        self.mode = mode
+        # Seuil de confiance traiter / escalader
+        self.threshold = threshold
+        # Scores dans [threshold - band, threshold + band[ : décision confiée au LLM
+        self.uncertainty_band = uncertainty_band
+        
+        self.agent = CachedAgent(Agent(
             name="Doxa Evaluator",
             model=MistralChat(id="mistral-small-latest", temperature=0.2),
             description="Agent d'évaluation de confiance et décision d'escalade",
@@ -75,7 +101,7 @@ class EvaluatorAgent:
                 '→ {"decision": "traiter", "confidence_finale": 0.82, "raison": "Score excellent malgré source unique"}',
             ],
             markdown=False
-        )
+        ), llm_cache)
     
     def evaluate(
         self,
@@ -96,7 +122,8 @@ class EvaluatorAgent:
             query_data: Données de la query (optionnel)
             
         Returns:
-            dict avec decision, confidence_finale, raison, priorite_escalade
+            dict avec decision, confidence_finale, raison, priorite_escalade,
+            provenance (regle, llm, regle_secours si le LLM a échoué)
         """
         
         # Préparer les données d'entrée
@@ -108,6 +135,10 @@ class EvaluatorAgent:
             "categorie": query_data.get('categorie', 'general') if query_data else 'general'
         }
         
+        # Cas nets : décision locale, sans appel réseau
+        if self.mode == "rules" or (self.mode == "hybrid" and self._is_clear_case(input_data)):
+            return {**self._fallback_evaluation(input_data), "provenance": "regle"}
+        
         prompt = f"""Évalue cette récupération de documents :
 
 DONNÉES DE RECHERCHE :
@@ -139,14 +170,24 @@ Réponds UNIQUEMENT avec le JSON demandé (pas de texte, pas de ```json)."""
                 
                 # Validation
                 result = self._validate_evaluation(result, input_data)
+                result['provenance'] = "llm"
+                self.agent.remember(prompt, response)
                 return result
             else:
                 print(f"⚠️ Pas de JSON dans l'évaluation")
-                return self._fallback_evaluation(input_data)
+                return {**self._fallback_evaluation(input_data), "provenance": "regle_secours"}
         
         except Exception as e:
             print(f"❌ Erreur Evaluator : {e}")
-            return self._fallback_evaluation(input_data)
+            return {**self._fallback_evaluation(input_data), "provenance": "regle_secours"}
+    
+    def _is_clear_case(self, input_data: dict) -> bool:
+        """Aucune source, ou score hors de la bande d'incertitude autour du seuil"""
+        if input_data['nombre_sources'] == 0:
+            return True
+        
+        score = input_data['score_moyen']
+        return abs(score - self.threshold) >= self.uncertainty_band
     
     def _validate_evaluation(self, result: dict, input_data: dict) -> dict:
         """Valide et normalise l'évaluation"""
@@ -154,7 +195,7 @@ Réponds UNIQUEMENT avec le JSON demandé (pas de texte, pas de ```json)."""
         # Décision valide
         if result.get('decision') not in ['traiter', 'escalader']:
             # Décision basée sur le score
-            if input_data['score_moyen'] >= 0.6:
+            if input_data['score_moyen'] >= self.threshold:
                 result['decision'] = 'traiter'
             else:
                 result['decision'] = 'escalader'
@@ -195,8 +236,8 @@ Réponds UNIQUEMENT avec le JSON demandé (pas de texte, pas de ```json)."""
         score = input_data['score_moyen']
         num_sources = input_data['nombre_sources']
         
-        # Règle simple : score >= 0.6 → traiter
-        if score >= 0.6 and num_sources > 0:
+        # Règle simple : score >= seuil → traiter
+        if score >= self.threshold and num_sources > 0:
             return {
                 "decision": "traiter",
                 "confidence_finale": score,
@@ -0,0 +1,138 @@
+# agents/fused_analyzer.py
+"""
+Triage + analyse de requête en un seul appel LLM
+
+Le Query Processor ne consomme que l'intention et le type du triage : les
+deux analyses tiennent dans une seule réponse JSON
+    {"triage": {...}, "analyse": {...}}
+validée bloc par bloc par les règles des deux agents
+(TriageAgent._validate_result, SmartQueryProcessor._validate_response).
+Les instructions sont composées à partir des constantes des deux modules
+(exceptions, catégories, documents KB, format JSON) : une règle ajoutée au
+triage ou à l'analyse s'applique aussi au chemin fusionné.
+
+Un aller-retour Mistral de moins sur chaque ticket non rejeté. En contrepartie,
+un ticket escaladé au triage a aussi payé l'analyse de requête.
+"""
+
+import json
+from typing import Optional, Tuple
+from agno.agent import Agent
+from agno.models.mistral import MistralChat
+
+from agents.triage_agent import (
+    TriageAgent, TRIAGE_MISSION, TRIAGE_EXCEPTION_RULES, TRIAGE_JSON_FIELDS
+)
+from agents.query_processor import (
+    SmartQueryProcessor, DOXA_CONTEXT, QUERY_MISSION, QUERY_CATEGORIES,
+    QUERY_DOCUMENTS, QUERY_CATEGORY_DOCUMENTS, QUERY_JSON_FIELDS
+)
+from agents.llm_cache import CachedAgent, LLMCache
+
+
+class FusedAnalyzer:
+    """
+    Agent fusionné Triage + Query Processing ; la validation et les réponses
+    de secours restent celles des deux agents d'origine
+    """
+
+    def __init__(
+        self,
+        triage: TriageAgent,
+        query_processor: SmartQueryProcessor,
+        llm_cache: Optional[LLMCache] = None
+    ):
+        self.triage = triage
+        self.query_processor = query_processor
+
+        self.agent = CachedAgent(Agent(
+            name="Doxa Fused Analyzer",
+            model=MistralChat(id="mistral-small-latest"),
+            description="Triage et analyse des tickets support Doxa en une passe",
+            instructions=[
+                DOXA_CONTEXT,
+                "",
+                "📋 TA MISSION (deux blocs, une seule réponse) :",
+                "▶ BLOC \"triage\" :",
+                *("   " + line for line in TRIAGE_MISSION),
+                "",
+                *TRIAGE_EXCEPTION_RULES,
+                "",
+                "▶ BLOC \"analyse\" (en tenant compte de l'intention et du type du triage) :",
+                *("   " + line for line in QUERY_MISSION),
+                "",
+                *QUERY_CATEGORIES,
+                "",
+                *QUERY_DOCUMENTS,
+                "",
+                *QUERY_CATEGORY_DOCUMENTS,
+                "",
+                "📤 FORMAT RÉPONSE (JSON strict) :",
+                "{",
+                '  "triage": {',
+                *("    " + field for field in TRIAGE_JSON_FIELDS),
+                "  },",
+                '  "analyse": {',
+                *("    " + field for field in QUERY_JSON_FIELDS),
+                "  }",
+                "}"
+            ],
+            markdown=False
+        ), llm_cache)
+
+    def analyze(self, question: str) -> Tuple[dict, dict]:
+        """
+        Returns:
+            (triage_result, query_data) aux formats de TriageAgent.analyze
+            et SmartQueryProcessor.process
+        """
+        prompt = f"""Analyse ce ticket client Doxa :
+
+QUESTION CLIENT :
+"{question}"
+
+Réponds UNIQUEMENT avec le JSON demandé."""
+
+        try:
+            response = self.agent.run(prompt)
+            content = response.content.strip()
+
+            if content.startswith('```'):
+                lines = content.split('\n')
+                content = '\n'.join(lines[1:-1]) if len(lines) > 2 else content
+
+            start = content.find('{')
+            end = content.rfind('}') + 1
+
+            if start != -1 and end > start:
+                result = json.loads(content[start:end])
+                if isinstance(result.get('triage'), dict) and isinstance(result.get('analyse'), dict):
+                    self.agent.remember(prompt, response)
+                return self._split_result(question, result)
+            else:
+                return self._fallback_response(question, "JSON non trouvé")
+
+        except Exception as e:
+            print(f"❌ Erreur Fused Analyzer : {e}")
+            return self._fallback_response(question, str(e))
+
+    def _split_result(self, question: str, result: dict) -> Tuple[dict, dict]:
+        """Valide chaque bloc avec les règles de son agent ; bloc absent → secours"""
+        triage_block = result.get('triage')
+        if isinstance(triage_block, dict):
+            triage_result = self.triage._validate_result(triage_block)
+        else:
+            triage_result = self.triage._fallback_response(question, "bloc triage absent")
+
+        query_block = result.get('analyse')
+        if isinstance(query_block, dict):
+            query_block['question_originale'] = question
+            query_data = self.query_processor._validate_response(query_block)
+        else:
+            query_data = self.query_processor._fallback_response(question, triage_result)
+
+        return triage_result, query_data
+
+    def _fallback_response(self, question: str, error_msg: str) -> Tuple[dict, dict]:
+        triage_result = self.triage._fallback_response(question, error_msg)
+        return triage_result, self.query_processor._fallback_response(question, triage_result)
@@ -0,0 +1,231 @@
+# agents/kb_bundle.py
+"""
+Format binaire versionné de la KB Doxa : un seul fichier doxa_kb.bundle
+
+Structure :
+  [index]     index FAISS sérialisé, à l'offset 0 (faiss.read_index lit le
+              bundle directement, y compris en mmap, et ignore la suite)
+  [sections]  alignées sur 64 octets :
+              docs          : textes extraits des documents, UTF-8 concaténés
+              doc_ranges    : int64  (2 par source), document s = docs[r[2s]:r[2s + 1]]
+              puis la table de chunks en colonnes (voir CHUNK_COLUMNS) :
+              source_ids    : uint16 (n), indice dans header["sources"]
+              chunk_ids, length_tokens, token_start, token_end : uint32 (n)
+              text_start, text_end : uint32 (n), span en octets dans le document
+              page          : uint16 (n)
+  [en-tête]   JSON : version, n, sources, doc_keys, config, sections {offset, length, dtype, crc32}
+  [trailer]   offset en-tête (u64) + taille en-tête (u32) + crc32 en-tête (u32) + magic (8 o)
+
+Écriture dans un fichier temporaire puis os.replace : un crash laisse le
+bundle précédent intact, index et métadonnées ne peuvent pas diverger.
+"""
+
+import os
+import mmap
+import json
+import zlib
+import struct
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from agents.chunk_store import CHUNK_COLUMNS, ChunkStore
+
+
+BUNDLE_FILE = "doxa_kb.bundle"
+BUNDLE_MAGIC = b"DOXAKB\x00\x00"
+BUNDLE_VERSION = 3
+ALIGNMENT = 64
+
+_TRAILER = struct.Struct("<QII8s")
+
+
+class BundleWriter:
+    """Écriture séquentielle des sections d'un bundle (CRC calculé au fil de l'eau)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._f = open(self.tmp_path, "wb")
+        self.sections: Dict[str, Dict] = {}
+        self._current: Optional[Dict] = None
+
+    def begin_section(self, name: str, dtype: str = "uint8"):
+        padding = -self._f.tell() % ALIGNMENT
+        self._f.write(b"\x00" * padding)
+        self._current = {"offset": self._f.tell(), "length": 0, "dtype": dtype, "crc32": 0}
+        self.sections[name] = self._current
+
+    def write(self, data: bytes):
+        self._f.write(data)
+        self._current["length"] += len(data)
+        self._current["crc32"] = zlib.crc32(data, self._current["crc32"])
+
+    def add_array(self, name: str, array: np.ndarray):
+        self.begin_section(name, str(array.dtype))
+        self.write(np.ascontiguousarray(array).tobytes())
+
+    def close(self, header: Dict) -> int:
+        """Finalise le bundle, retourne sa version (CRC de l'en-tête)"""
+        header = {**header, "version": BUNDLE_VERSION, "sections": self.sections}
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        header_crc = zlib.crc32(header_bytes)
+
+        header_offset = self._f.tell()
+        self._f.write(header_bytes)
+        self._f.write(_TRAILER.pack(header_offset, len(header_bytes), header_crc, BUNDLE_MAGIC))
+
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.tmp_path, self.path)
+        return header_crc
+
+    def abort(self):
+        self._f.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def write_bundle(path: Path, index, chunks: ChunkStore, config: Dict) -> int:
+    """
+    Écrit index + documents + table de chunks dans un bundle unique (atomique).
+    Retourne la version du bundle (CRC de l'en-tête, qui couvre les CRC des sections).
+    """
+    writer = BundleWriter(path)
+    try:
+        writer.begin_section("index")
+        writer.write(faiss.serialize_index(index).tobytes())
+
+        # Documents recopiés dans l'ordre des sources (le blob est compacté au passage)
+        writer.begin_section("docs")
+        doc_ranges = np.zeros(2 * len(chunks.sources), dtype="int64")
+        position = 0
+        for source_id, (start, end) in enumerate(chunks.doc_ranges):
+            writer.write(chunks.doc_blob[start:end])
+            doc_ranges[2 * source_id:2 * source_id + 2] = (position, position + end - start)
+            position += end - start
+
+        writer.add_array("doc_ranges", doc_ranges)
+        for name, dtype in CHUNK_COLUMNS.items():
+            writer.add_array(name, getattr(chunks, name).astype(dtype, copy=False))
+
+        return writer.close({
+            "num_chunks": len(chunks),
+            "sources": chunks.sources,
+            "doc_keys": chunks.doc_keys,
+            "config": config
+        })
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class KBBundle:
+    """
+    Lecture d'un bundle : fichier mappé en mémoire, en-tête validé (magic,
+    version, CRC, cohérence des sections). Les colonnes sont des vues numpy
+    sur le mapping, les textes des chunks sont découpés dans les documents
+    et décodés à la demande.
+    """
+
+    def __init__(self, path: Path, verify: bool = False):
+        self.path = Path(path)
+
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < _TRAILER.size:
+            raise ValueError("bundle tronqué")
+
+        header_offset, header_size, header_crc, magic = _TRAILER.unpack_from(self._mm, len(self._mm) - _TRAILER.size)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError("bundle invalide (magic)")
+        if header_offset + header_size + _TRAILER.size != len(self._mm):
+            raise ValueError("bundle invalide (taille d'en-tête)")
+
+        header_bytes = self._mm[header_offset:header_offset + header_size]
+        if zlib.crc32(header_bytes) != header_crc:
+            raise ValueError("bundle corrompu (CRC de l'en-tête)")
+
+        # Version du contenu : le CRC de l'en-tête couvre ceux de toutes les sections
+        self.checksum = header_crc
+        self.header = json.loads(header_bytes)
+        if self.header.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"version de bundle non supportée : {self.header.get('version')}")
+
+        self.sections = self.header["sections"]
+        self.sources: List[str] = self.header["sources"]
+        self.doc_keys: Optional[List[Optional[str]]] = self.header.get("doc_keys")
+        self.config: Dict = self.header["config"]
+        self.num_chunks: int = self.header["num_chunks"]
+
+        self._validate(header_offset, verify)
+
+    def _validate(self, data_end: int, verify: bool):
+        for name, section in self.sections.items():
+            if section["offset"] + section["length"] > data_end:
+                raise ValueError(f"section {name} hors limites")
+
+        # Table de chunks : petite, toujours vérifiée ; index et documents sur demande
+        checked = list(CHUNK_COLUMNS) + ["doc_ranges"]
+        if verify:
+            checked += ["index", "docs"]
+        for name in checked:
+            if zlib.crc32(self.section_view(name)) != self.sections[name]["crc32"]:
+                raise ValueError(f"bundle corrompu (CRC de la section {name})")
+
+        n = self.num_chunks
+        for name in CHUNK_COLUMNS:
+            if len(self.array(name)) != n:
+                raise ValueError(f"colonne {name} incohérente ({len(self.array(name))} != {n})")
+
+        doc_ranges = self.array("doc_ranges").reshape(-1, 2)
+        if len(doc_ranges) != len(self.sources):
+            raise ValueError("nombre de documents incohérent")
+        if len(doc_ranges) and (
+            (doc_ranges[:, 0] > doc_ranges[:, 1]).any()
+            or doc_ranges[:, 1].max() > self.sections["docs"]["length"]
+        ):
+            raise ValueError("documents hors limites")
+        if not n:
+            return
+
+        source_ids = self.array("source_ids")
+        if int(source_ids.max()) >= len(self.sources):
+            raise ValueError("identifiant de source hors limites")
+        doc_lengths = (doc_ranges[:, 1] - doc_ranges[:, 0])[source_ids]
+        if (
+            (self.array("text_start") > self.array("text_end")).any()
+            or (self.array("text_end") > doc_lengths).any()
+        ):
+            raise ValueError("span de chunk hors de son document")
+
+    def section_view(self, name: str) -> memoryview:
+        section = self.sections[name]
+        return memoryview(self._mm)[section["offset"]:section["offset"] + section["length"]]
+
+    def array(self, name: str) -> np.ndarray:
+        section = self.sections[name]
+        dtype = np.dtype(section["dtype"])
+        return np.frombuffer(self._mm, dtype=dtype, count=section["length"] // dtype.itemsize, offset=section["offset"])
+
+    def read_index(self, mmap_index: bool = False):
+        """Index FAISS : lu depuis l'offset 0 du bundle (mappé si possible)"""
+        if mmap_index:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            try:
+                return faiss.read_index(str(self.path), flags), True
+            except RuntimeError:
+                pass
+        return faiss.read_index(str(self.path)), False
+
+    def chunk_store(self) -> ChunkStore:
+        """Table de chunks : colonnes et documents en vues sur le bundle mappé (zéro copie)"""
+        return ChunkStore(
+            self.section_view("docs"),
+            self.sources,
+            self.array("doc_ranges").reshape(-1, 2).tolist(),
+            {name: self.array(name) for name in CHUNK_COLUMNS},
+            self.doc_keys
+        )
@@ -0,0 +1,182 @@
+# agents/llm_cache.py
+"""
+Cache persistant des appels LLM (agents agno)
+
+Clé     : SHA-256 de (nom de l'agent, modèle, température, hash des
+          instructions, prompt) : un changement de prompt système ou de
+          modèle n'est jamais servi par une ancienne réponse
+Stockage: SQLite (une table), partagé par tous les agents
+Éviction: TTL + taille maximale (les moins récemment utilisées d'abord)
+
+Rejouer un lot de tickets ou une campagne de régression ne repaie ni la
+latence ni le coût des appels déjà faits.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class LLMCache:
+    """
+    Réponses LLM en SQLite, avec statistiques hits / misses
+    """
+
+    def __init__(
+        self,
+        db_path: str = "vector_db/llm_cache.sqlite",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._create_table()
+
+    def _create_table(self):
+        with self._lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT,
+                    model TEXT,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+            self.conn.commit()
+
+    @staticmethod
+    def key(agent_name: str, model_id: str, temperature: Optional[float], instructions_hash: str, prompt: str) -> str:
+        payload = json.dumps(
+            [agent_name, model_id, temperature, instructions_hash, prompt],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str, agent_name: str = "", model_id: str = ""):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, model, content, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent_name, model_id, content, now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float):
+        """TTL puis taille maximale (appelée sous verrou)"""
+        self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.conn.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            per_agent = dict(self.conn.execute(
+                "SELECT agent, SUM(hits) FROM llm_cache GROUP BY agent"
+            ).fetchall())
+
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "hits_per_agent": per_agent
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+class CachedResponse:
+    """Réponse servie par le cache : même interface que la réponse agno utilisée par les agents"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.cached = True
+
+
+class CachedAgent:
+    """
+    Enveloppe d'un agent agno : run(prompt) sert les réponses du cache.
+    Une réponse neuve n'y entre que via remember(prompt, response), appelé
+    par l'agent une fois la réponse parsée et validée : une réponse
+    malformée n'est jamais rejouée.
+    Sans cache (llm_cache=None), les appels sont transmis tels quels.
+    """
+
+    def __init__(self, agent, llm_cache: Optional[LLMCache] = None):
+        self.agent = agent
+        self.llm_cache = llm_cache
+
+        model = agent.model
+        self.model_id = getattr(model, "id", type(model).__name__)
+        self.temperature = getattr(model, "temperature", None)
+        instructions = json.dumps([agent.description, agent.instructions], ensure_ascii=False, default=str)
+        self.instructions_hash = hashlib.sha256(instructions.encode("utf-8")).hexdigest()
+
+    def _key(self, prompt: str) -> str:
+        return LLMCache.key(self.agent.name, self.model_id, self.temperature, self.instructions_hash, prompt)
+
+    def run(self, prompt: str, **kwargs):
+        if self.llm_cache is None or kwargs:
+            return self.agent.run(prompt, **kwargs)
+
+        content = self.llm_cache.get(self._key(prompt))
+        if content is not None:
+            return CachedResponse(content)
+
+        return self.agent.run(prompt)
+
+    def remember(self, prompt: str, response):
+        """Met en cache une réponse déjà validée par l'appelant"""
+        if self.llm_cache is None or getattr(response, "cached", False):
+            return
+        if isinstance(response.content, str) and response.content.strip():
+            self.llm_cache.put(self._key(prompt), response.content, self.agent.name, self.model_id)
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
@@ -0,0 +1,210 @@
+# agents/neighbour_table.py
+"""
+Table des voisins de chaque chunk, calculée une fois à l'indexation
+
+- prev_ids / next_ids : int32, chunk précédent / suivant du même document
+                        (ordre des chunk_id), -1 aux extrémités
+- semantic_ids        : int32 (chunks, k), plus proches voisins cosinus
+                        (le chunk lui-même exclu), -1 si moins de k chunks ;
+                        recherche dans l'index FAISS de la KB (exacte en flat,
+                        approchée en IVF / HNSW)
+- similarities        : float16 (chunks, k), cosinus correspondants
+Fichier : vector_db/doxa_kb.neighbours.npz, lié au bundle par sa version
+
+Une réponse coupée entre les chunks N et N+1 se complète par simple lecture
+de la table, sans encodage ni recherche FAISS supplémentaire.
+Ré-indexation incrémentale : seules les lignes des nouveaux chunks et celles
+qui ont perdu un voisin sont recalculées ; les autres sont fusionnées avec
+leurs plus proches voisins parmi les nouveaux chunks.
+"""
+
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Callable, Tuple
+
+from agents.chunk_store import ChunkStore
+
+NEIGHBOUR_FILE = "doxa_kb.neighbours.npz"
+
+
+class NeighbourTable:
+    """
+    Voisins séquentiels et sémantiques par position de chunk
+    """
+
+    def __init__(self, prev_ids: np.ndarray, next_ids: np.ndarray, semantic_ids: np.ndarray, similarities: np.ndarray):
+        self.prev_ids = prev_ids
+        self.next_ids = next_ids
+        self.semantic_ids = semantic_ids
+        self.similarities = similarities
+
+    @classmethod
+    def build(
+        cls,
+        chunks: ChunkStore,
+        vectors: Callable[[np.ndarray], np.ndarray],
+        search: Callable[[np.ndarray, int], Tuple[np.ndarray, np.ndarray]],
+        k: int = 5,
+        batch_size: int = 1024
+    ) -> "NeighbourTable":
+        """
+        vectors : positions → vecteurs normalisés des chunks (lus par lots)
+        search  : (vecteurs, n) → (scores, positions) des n plus proches chunks de la KB
+        """
+        num_chunks = len(chunks)
+        prev_ids, next_ids = cls._sequential(chunks)
+        semantic_ids = np.full((num_chunks, k), -1, dtype="int32")
+        similarities = np.zeros((num_chunks, k), dtype="float16")
+
+        if num_chunks > 1 and k:
+            cls._search_rows(np.arange(num_chunks), semantic_ids, similarities, vectors, search, batch_size)
+        return cls(prev_ids, next_ids, semantic_ids, similarities)
+
+    def update(
+        self,
+        chunks: ChunkStore,
+        keep: np.ndarray,
+        vectors: Callable[[np.ndarray], np.ndarray],
+        search: Callable[[np.ndarray, int], Tuple[np.ndarray, np.ndarray]],
+        batch_size: int = 1024
+    ) -> "NeighbourTable":
+        """
+        Table après ré-indexation incrémentale (chunks conservés : masque `keep`
+        sur les anciennes positions ; nouveaux chunks en fin de table), en
+        O(chunks × nouveaux chunks) au lieu de O(chunks²)
+        """
+        num_chunks, k = len(chunks), self.semantic_ids.shape[1]
+        num_kept = int(keep.sum())
+        prev_ids, next_ids = self._sequential(chunks)
+
+        # Anciennes positions → nouvelles (-1 : chunk retiré ; la dernière case sert aux -1)
+        positions = np.full(len(keep) + 1, -1, dtype="int64")
+        positions[:-1][keep] = np.arange(num_kept)
+        old_ids = self.semantic_ids[keep]
+        semantic_ids = np.full((num_chunks, k), -1, dtype="int32")
+        similarities = np.zeros((num_chunks, k), dtype="float16")
+        semantic_ids[:num_kept] = positions[old_ids]
+        similarities[:num_kept] = self.similarities[keep]
+
+        lost = np.flatnonzero(((old_ids >= 0) & (semantic_ids[:num_kept] < 0)).any(axis=1))
+        new_rows = np.arange(num_kept, num_chunks)
+
+        if len(new_rows) and num_kept and k:
+            # Lignes intactes : fusion avec les plus proches parmi les nouveaux chunks
+            new_index = None
+            for start in range(0, len(new_rows), batch_size):
+                batch_vectors = vectors(new_rows[start:start + batch_size])
+                if new_index is None:
+                    new_index = faiss.IndexFlatIP(batch_vectors.shape[1])
+                new_index.add(batch_vectors)
+
+            intact = np.setdiff1d(np.arange(num_kept), lost)
+            for start in range(0, len(intact), batch_size):
+                rows = intact[start:start + batch_size]
+                scores, ids = new_index.search(vectors(rows), min(k, len(new_rows)))
+                ids = np.where(ids >= 0, ids + num_kept, -1)
+                semantic_ids[rows], similarities[rows] = self._merge(
+                    semantic_ids[rows], similarities[rows], ids, scores, k
+                )
+
+        # Nouveaux chunks et lignes ayant perdu un voisin : recherche complète
+        rows = np.concatenate([lost, new_rows])
+        if len(rows) and num_chunks > 1 and k:
+            self._search_rows(rows, semantic_ids, similarities, vectors, search, batch_size)
+        return NeighbourTable(prev_ids, next_ids, semantic_ids, similarities)
+
+    @staticmethod
+    def _sequential(chunks: ChunkStore) -> Tuple[np.ndarray, np.ndarray]:
+        """Voisins séquentiels : tri par (document, chunk_id)"""
+        num_chunks = len(chunks)
+        order = np.lexsort((chunks.chunk_ids, chunks.source_ids))
+        same_source = chunks.source_ids[order][1:] == chunks.source_ids[order][:-1]
+        prev_ids = np.full(num_chunks, -1, dtype="int32")
+        next_ids = np.full(num_chunks, -1, dtype="int32")
+        prev_ids[order[1:][same_source]] = order[:-1][same_source]
+        next_ids[order[:-1][same_source]] = order[1:][same_source]
+        return prev_ids, next_ids
+
+    @staticmethod
+    def _search_rows(
+        rows: np.ndarray,
+        semantic_ids: np.ndarray,
+        similarities: np.ndarray,
+        vectors: Callable[[np.ndarray], np.ndarray],
+        search: Callable[[np.ndarray, int], Tuple[np.ndarray, np.ndarray]],
+        batch_size: int
+    ):
+        """Voisins sémantiques des lignes `rows`, par lots, le chunk lui-même retiré"""
+        k = semantic_ids.shape[1]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            scores, ids = search(vectors(batch), k + 1)
+
+            # Retire le chunk lui-même (ou le dernier voisin s'il n'apparaît pas : doublons exacts)
+            valid = (ids >= 0) & (ids != batch[:, None])
+            order = np.argsort(~valid, axis=1, kind="stable")[:, :k]
+            valid = np.take_along_axis(valid, order, axis=1)
+            semantic_ids[batch] = np.where(valid, np.take_along_axis(ids, order, axis=1), -1)
+            similarities[batch] = np.where(valid, np.take_along_axis(scores, order, axis=1), 0.0)
+
+    @staticmethod
+    def _merge(
+        ids: np.ndarray,
+        similarities: np.ndarray,
+        candidate_ids: np.ndarray,
+        candidate_scores: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """k meilleurs voisins parmi les actuels et les candidats (ensembles disjoints)"""
+        all_ids = np.hstack([ids, candidate_ids])
+        all_scores = np.hstack([
+            np.where(ids >= 0, similarities.astype("float32"), -np.inf),
+            np.where(candidate_ids >= 0, candidate_scores, -np.inf)
+        ])
+        order = np.argsort(-all_scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(all_scores, order, axis=1)
+        found = np.isfinite(scores)
+        return (
+            np.where(found, np.take_along_axis(all_ids, order, axis=1), -1),
+            np.where(found, scores, 0.0)
+        )
+
+    def __len__(self) -> int:
+        return len(self.prev_ids)
+
+    def sequential(self, idx: int) -> Tuple[int, int]:
+        """(précédent, suivant) du chunk, -1 s'il n'y en a pas"""
+        return int(self.prev_ids[idx]), int(self.next_ids[idx])
+
+    def semantic(self, idx: int, k: int) -> np.ndarray:
+        """Jusqu'à k voisins sémantiques du chunk, du plus proche au plus lointain"""
+        neighbours = self.semantic_ids[idx, :k]
+        return neighbours[neighbours >= 0]
+
+    def summary(self) -> str:
+        return f"{len(self)} chunks, {self.semantic_ids.shape[1]} voisins sémantiques"
+
+    # --------------------------------------------------
+    # Persistance
+    # --------------------------------------------------
+    def save(self, path: Path, kb_version: int):
+        """Écriture atomique, liée à la version du bundle"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                kb_version=np.array(kb_version, dtype="int64"),
+                prev_ids=self.prev_ids,
+                next_ids=self.next_ids,
+                semantic_ids=self.semantic_ids,
+                similarities=self.similarities
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Tuple["NeighbourTable", int]:
+        with np.load(path) as data:
+            table = cls(data["prev_ids"], data["next_ids"], data["semantic_ids"], data["similarities"])
+            return table, int(data["kb_version"])
@@ -6,11 +6,16 @@ Coordonne tous les agents : Triage → Query → Retrieval → Evaluator → Res
 
 import time
 import uuid
+from typing import Optional
 from agents.triage_agent import TriageAgent
 from agents.query_processor import SmartQueryProcessor
+from agents.fused_analyzer import FusedAnalyzer
 from agents.retrieval_agent import RetrievalAgent
 from agents.evaluator_agent import EvaluatorAgent
 from agents.response_composer import ResponseComposer
+from agents.semantic_cache import SemanticAnswerCache
+from agents.llm_cache import LLMCache
+from agents.pre_triage import PreTriage
 
 
 class OrchestratorAgent:
@@ -19,35 +24,95 @@ class OrchestratorAgent:
     Pipeline complet : Triage → Query → Retrieval → Evaluation → Response
     """
     
-    def __init__(self, document_processor):
+    def __init__(
+        self,
+        document_processor,
+        cross_encoder_model: Optional[str] = None,
+        rerank_budget_ms: float = 150.0,
+        use_answer_cache: bool = True,
+        answer_cache_threshold: float = 0.92,
+        answer_cache_ttl: float = 3600.0,
+        use_llm_cache: bool = True,
+        evaluation_mode: str = "hybrid",
+        evaluation_threshold: float = 0.6,
+        evaluation_band: float = 0.1,
+        fused_analysis: bool = False
+    ):
         """
         Initialise l'orchestrateur avec tous les agents
         
         Args:
             document_processor: Instance de DocumentProcessor avec index FAISS chargé
+            cross_encoder_model: Cross-encoder de reranking (None : désactivé)
+            rerank_budget_ms: Budget de latence du cross-encoder par ticket
+            use_answer_cache: Cache sémantique des réponses devant le pipeline
+            answer_cache_threshold: Similarité minimale entre questions pour un hit
+            answer_cache_ttl: Durée de vie d'une réponse en cache (secondes)
+            use_llm_cache: Cache SQLite des appels LLM, partagé par les agents
+            evaluation_mode: hybrid (LLM dans la bande d'incertitude seulement), rules ou llm
+            evaluation_threshold: Seuil de confiance traiter / escalader
+            evaluation_band: Demi-largeur de la bande où la décision revient au LLM
+            fused_analysis: Triage et analyse de requête en un seul appel LLM
         """
         
         print("🔧 Initialisation de l'Orchestrator complet...\n")
         
+        # Appels Mistral mémorisés (rejeu d'un lot, tests de régression)
+        self.llm_cache = None
+        if use_llm_cache:
+            self.llm_cache = LLMCache(str(document_processor.index_dir / "llm_cache.sqlite"))
+        
+        # Pré-triage local (règles compilées) : le vocabulaire de la KB sert
+        # de dictionnaire pour la détection de charabia
+        lexical_index = document_processor.lexical_index
+        self.pre_triage = PreTriage(lexical_index.vocab if lexical_index is not None else None)
+        
         # Agents de traitement
         print("   • Chargement Triage Agent...")
-        self.triage = TriageAgent()
+        self.triage = TriageAgent(llm_cache=self.llm_cache)
         
         print("   • Chargement Query Processor...")
-        self.query_processor = SmartQueryProcessor()
+        self.query_processor = SmartQueryProcessor(llm_cache=self.llm_cache)
+        
+        # Option : triage + analyse en un seul appel (validation des deux agents)
+        self.fused_analyzer = None
+        if fused_analysis:
+            print("   • Chargement Fused Analyzer...")
+            self.fused_analyzer = FusedAnalyzer(self.triage, self.query_processor, llm_cache=self.llm_cache)
         
         print("   • Chargement Retrieval Agent...")
-        self.retrieval = RetrievalAgent(document_processor)
+        self.retrieval = RetrievalAgent(
+            document_processor,
+            query_cache_path=str(document_processor.index_dir / "query_cache.npz"),
+            cross_encoder_model=cross_encoder_model,
+            rerank_budget_ms=rerank_budget_ms
+        )
         
         print("   • Chargement Evaluator Agent...")
-        self.evaluator = EvaluatorAgent()
+        self.evaluator = EvaluatorAgent(
+            llm_cache=self.llm_cache,
+            mode=evaluation_mode,
+            threshold=evaluation_threshold,
+            uncertainty_band=evaluation_band
+        )
         
         print("   • Chargement Response Composer...")
-        self.response_composer = ResponseComposer()
+        self.response_composer = ResponseComposer(llm_cache=self.llm_cache)
+        
+        # Questions quasi identiques (même panne) : réponse stockée, sans appel Mistral
+        self.doc_processor = document_processor
+        self.answer_cache = None
+        if use_answer_cache:
+            self.answer_cache = SemanticAnswerCache(
+                document_processor.embedder.get_sentence_embedding_dimension(),
+                threshold=answer_cache_threshold,
+                ttl_seconds=answer_cache_ttl,
+                kb_version=document_processor.kb_version
+            )
         
         print("\n✅ Orchestrator prêt !")
         print(f"   📊 Index FAISS : {document_processor.index.ntotal} vecteurs")
-        print(f"   📚 Documents : {len(set(m['source'] for m in document_processor.metadata))}")
+        print(f"   📚 Documents : {len(document_processor.chunks.source_counts())}")
         print(f"   ✂️  Chunks : {len(document_processor.documents)}\n")
     
     def process_ticket(self, ticket_id: str, question: str) -> dict:
@@ -55,7 +120,7 @@ class OrchestratorAgent:
         Traite un ticket client de bout en bout
         
         Pipeline :
-        1. Triage (validation + exceptions)
+        1. Triage (pré-triage local par règles, puis LLM : validation + exceptions)
         2. Query Processing (analyse + classification)
         3. Retrieval (RAG)
         4. Evaluation (décision traiter/escalader)
@@ -75,22 +140,48 @@ class OrchestratorAgent:
         # Démarrer le chronomètre
         start_time = time.time()
         
+        # Pré-triage local : valeurs sensibles masquées avant tout prompt,
+        # logs et base de résultats
+        pre_triage = self.pre_triage.analyze(question)
+        question = pre_triage['question_redacted']
+        
         print("=" * 70)
         print(f"🎫 TICKET #{ticket_id} [trace:{trace_id}]")
         print("=" * 70)
         print(f"❓ Question : {question}\n")
         
+        # ══════════════════════════════════════════════════════════
+        # Cache sémantique : ticket quasi identique déjà traité
+        # ══════════════════════════════════════════════════════════
+        question_emb = None
+        if self.answer_cache is not None and not pre_triage['decisive']:
+            question_emb = self.retrieval._encode_queries([question])[0]
+            cached = self.answer_cache.lookup(question_emb, self.doc_processor.kb_version)
+            if cached is not None:
+                return self._cached_result(ticket_id, question, trace_id, start_time, *cached)
+        
         # ══════════════════════════════════════════════════════════
         # ÉTAPE 1 : Triage (validation + détection exceptions)
         # ══════════════════════════════════════════════════════════
         print("🔍 ÉTAPE 1/5 : Triage...")
         triage_start = time.time()
         
-        triage_result = self.triage.analyze(question)
+        # Données sensibles, colère ou charabia : tranché sans appel LLM
+        query_data = None
+        if pre_triage['decisive']:
+            triage_result = pre_triage
+        elif self.fused_analyzer is not None:
+            triage_result, query_data = self.fused_analyzer.analyze(question)
+        else:
+            triage_result = self.triage.analyze(question)
         
         triage_time = time.time() - triage_start
         
         print(f"   ⏱️  Temps : {triage_time:.2f}s")
+        if pre_triage['decisive']:
+            print(f"   Pré-triage   : {pre_triage['reasoning']}")
+        if query_data is not None:
+            print("   Analyse      : fusionnée avec le triage (un seul appel)")
         print(f"   Cohérent     : {'✅' if triage_result['coherent'] else '❌'}")
         print(f"   Type         : {triage_result['type_question']}")
         
@@ -153,7 +244,9 @@ class OrchestratorAgent:
         print("🧠 ÉTAPE 2/5 : Analyse et classification...")
         query_start = time.time()
         
-        query_data = self.query_processor.process(question, triage_result)
+        # Mode fusionné : analyse déjà produite par l'appel de triage
+        if query_data is None:
+            query_data = self.query_processor.process(question, triage_result)
         
         query_time = time.time() - query_start
         
@@ -195,7 +288,8 @@ class OrchestratorAgent:
         print(f"   ⏱️  Temps : {eval_time:.2f}s")
         print(f"   Décision     : {evaluation['decision'].upper()}")
         print(f"   Confiance    : {evaluation['confidence_finale']:.0%}")
-        print(f"   Raison       : {evaluation['raison']}\n")
+        print(f"   Raison       : {evaluation['raison']}")
+        print(f"   Provenance   : {evaluation.get('provenance', 'llm')}\n")
         
         # Si escalade nécessaire, arrêter ici
         if evaluation['decision'] == 'escalader':
@@ -258,7 +352,7 @@ class OrchestratorAgent:
         # ══════════════════════════════════════════════════════════
         # Résultat final
         # ══════════════════════════════════════════════════════════
-        return {
+        result = {
             "ticket_id": ticket_id,
             "question": question,
             "status": "completed",
@@ -276,4 +370,43 @@ class OrchestratorAgent:
                 "total": f"{total_time:.2f}s"
             },
             "trace_id": trace_id
-        }
\ No newline at end of file
+        }
+        
+        # Réponses de secours (LLM indisponible, quota) : jamais mises en cache,
+        # elles seraient resservies à chaque ticket similaire pendant tout le TTL
+        degraded = evaluation.get('provenance') == "regle_secours" or response_data.get('provenance') != "llm"
+        if self.answer_cache is not None and not degraded:
+            self.answer_cache.store(question_emb, question, result, self.doc_processor.kb_version)
+        
+        return result
+    
+    def _cached_result(
+        self,
+        ticket_id: str,
+        question: str,
+        trace_id: str,
+        start_time: float,
+        cached: dict,
+        cached_question: str,
+        similarity: float
+    ) -> dict:
+        """Résultat d'un ticket servi par le cache sémantique"""
+        total_time = time.time() - start_time
+        
+        print(f"⚡ Réponse en cache (similarité {similarity:.3f})")
+        print(f"   Question d'origine : {cached_question}")
+        print(f"   ⏱️  Temps : {total_time * 1000:.1f}ms\n")
+        
+        return {
+            **cached,
+            "ticket_id": ticket_id,
+            "question": question,
+            "cache": {
+                "hit": True,
+                "similarity": similarity,
+                "question_origine": cached_question,
+                "ticket_origine": cached["ticket_id"]
+            },
+            "execution_time": {"total": f"{total_time:.2f}s"},
+            "trace_id": trace_id
+        }
@@ -0,0 +1,320 @@
+# agents/pre_triage.py
+"""
+Pré-triage local et déterministe, avant tout appel LLM
+
+Détections (motifs compilés une fois) :
+- cartes bancaires : 13 à 19 chiffres (espaces / tirets tolérés), clé de Luhn valide
+- téléphones algériens : +213 / 00213 / 0, mobiles 5-7 (9 chiffres), fixes 2-4 (8 chiffres)
+- mots de passe divulgués : "mot de passe est ...", "mdp : ...", "password = ...",
+  seulement si la valeur ressemble à un secret (lettres + chiffres, symboles,
+  valeur entre guillemets, mot hors vocabulaire) : "mot de passe est
+  incorrect / refusé / trop court" reste une question d'authentification
+- colère : termes sans ambiguïté (colère, menaces) ; les marqueurs de
+  frustration ("toujours pas", "encore une fois"...) ne comptent qu'avec des
+  cris (majuscules et "!!!") et sont sinon laissés au LLM
+- charabia : ratio de mots connus (vocabulaire de la KB + mots courants),
+  suites de consonnes, entropie des caractères ; jugé seulement sur un texte
+  en alphabet latin : arabe, cyrillique... ou texte sans mot ("500 ?") sont
+  laissés au LLM
+
+Un ticket avec données sensibles, colère ou charabia est tranché ici (même
+format que le TriageAgent) et part directement vers l'escalade / le rejet.
+Les valeurs sensibles sont masquées avant qu'un prompt ne soit envoyé.
+"""
+
+import re
+import math
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agents.bm25_index import STOPWORDS
+
+# --------------------------------------------------
+# Données sensibles
+# --------------------------------------------------
+CARD_CANDIDATE = re.compile(r"(?<![\d-])\d(?:[ -]?\d){12,18}(?![\d-])")
+
+PHONE_DZ = re.compile(
+    r"(?<![\d+])(?:\+213|00213|0)[ .-]?"
+    r"(?:[5-7](?:[ .-]?\d){8}|[2-4](?:[ .-]?\d){7})"
+    r"(?!\d)"
+)
+
+PASSWORD_DISCLOSURE = re.compile(
+    r"\b(?:mot de passe|mdp|password|passwd|pwd)\b"
+    r"(?:\s+(?:actuel|temporaire))?"
+    r"\s*(?::|=|\best\b|\bc'est\b|\bis\b)\s*"
+    r"(?P<quote>[\"'«])?\s*(?P<value>[^\s\"'»,;]{3,})",
+    re.IGNORECASE
+)
+
+# Valeurs qui décrivent le mot de passe au lieu de le donner (texte sans accents)
+NOT_SECRET = frozenset("""
+    pas plus jamais toujours trop tres bien mal bon mauvais faux correct incorrect incorrecte
+    refuse refusee invalide expire expiree bloque bloquee verrouille verrouillee perdu oublie
+    errone erronee change modifie reinitialise vide court long faible fort obligatoire requis
+    not no never wrong invalid expired blocked locked lost forgotten working too correct
+""".split())
+
+# --------------------------------------------------
+# Colère (texte sans accents, minuscules)
+# --------------------------------------------------
+# Décisifs seuls : colère explicite et menaces
+ANGER_LEXICON = (
+    "furieux", "furieuse", "enerve", "enervee", "enerves", "enervees",
+    "inacceptable", "catastrophique",
+    "avocat", "porter plainte", "deposer plainte", "deposer une plainte",
+    "poursuites judiciaires", "tribunal",
+)
+# Frustration ou ironie possibles, mais aussi tournures neutres
+# ("ne fonctionne toujours pas", "encore une fois merci")
+FRUSTRATION_LEXICON = (
+    "inadmissible", "scandaleux", "scandaleuse", "honteux", "honte", "arnaque",
+    "lamentable", "ras le bol", "marre", "n'importe quoi",
+    "3eme fois", "troisieme fois", "encore une fois", "toujours pas",
+    "remboursement immediat",
+)
+
+
+def _alternation(words: Iterable[str]) -> "re.Pattern":
+    return re.compile(
+        r"\b(?:" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")\b"
+    )
+
+
+ANGER_PATTERN = _alternation(ANGER_LEXICON)
+FRUSTRATION_PATTERN = _alternation(FRUSTRATION_LEXICON)
+
+# --------------------------------------------------
+# Charabia
+# --------------------------------------------------
+COMMON_WORDS = frozenset("""
+    bonjour merci comment pourquoi quand quel quelle quels quelles combien
+    probleme erreur bug compte connexion connecter projet tache equipe membre
+    plan prix abonnement facture paiement export donnees fichier page
+    impossible marche fonctionne peux peut veux voudrais besoin aide
+    hello help please error account login project team price
+""".split())
+CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{5,}")
+WORD = re.compile(r"[a-z]{2,}")
+MIN_JUDGED_LETTERS = 4
+
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents (apostrophes typographiques normalisées)"""
+    text = text.replace("’", "'").lower()
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+class PreTriage:
+    """
+    Règles de pré-triage, sans appel réseau ; `vocabulary` : mots connus
+    (ex. vocabulaire BM25 de la KB) pour la détection de charabia
+    """
+
+    def __init__(
+        self,
+        vocabulary: Optional[Iterable[str]] = None,
+        min_known_ratio: float = 0.3,
+        min_entropy: float = 2.0
+    ):
+        self.vocabulary = frozenset(vocabulary or ()) | COMMON_WORDS | STOPWORDS
+        self.min_known_ratio = min_known_ratio
+        self.min_entropy = min_entropy
+
+    def analyze(self, question: str) -> Dict:
+        """
+        Résultat au format du TriageAgent, plus :
+        - decisive         : True si le ticket est tranché sans LLM
+        - question_redacted: question avec les valeurs sensibles masquées
+        - detections       : types de valeurs détectées (carte, telephone, mot_de_passe)
+        """
+        redacted, detections = self.redact(question)
+        exceptions: List[str] = []
+        reasons: List[str] = []
+
+        if detections:
+            exceptions.append("data_sensitive")
+            reasons.append(f"données sensibles : {', '.join(sorted(set(detections)))}")
+
+        anger = self.anger_signals(question)
+        if anger:
+            exceptions.append("emotion_negative")
+            reasons.append(f"colère : {', '.join(anger)}")
+
+        coherent = not self.is_gibberish(question)
+        if not coherent:
+            reasons.append("texte incohérent (charabia)")
+
+        return {
+            "coherent": coherent,
+            "intention": "Tranché par le pré-triage" if reasons else "",
+            "type_question": "question",
+            "reasoning": "Pré-triage : " + "; ".join(reasons) if reasons else "Pré-triage : rien à signaler",
+            "exceptions": exceptions,
+            "decisive": bool(reasons),
+            "question_redacted": redacted,
+            "detections": detections,
+            "source": "pre_triage"
+        }
+
+    # --------------------------------------------------
+    # Données sensibles
+    # --------------------------------------------------
+    def redact(self, text: str) -> Tuple[str, List[str]]:
+        detections: List[str] = []
+
+        def card(match):
+            digits = re.sub(r"\D", "", match.group())
+            if 13 <= len(digits) <= 19 and luhn_valid(digits):
+                detections.append("carte")
+                return "[CARTE]"
+            return match.group()
+
+        def phone(match):
+            detections.append("telephone")
+            return "[TELEPHONE]"
+
+        def password(match):
+            if not self.looks_like_secret(match.group("value"), bool(match.group("quote"))):
+                return match.group()
+            detections.append("mot_de_passe")
+            start = match.start("value") - match.start()
+            return match.group()[:start] + "[MOT_DE_PASSE]"
+
+        text = CARD_CANDIDATE.sub(card, text)
+        text = PHONE_DZ.sub(phone, text)
+        text = PASSWORD_DISCLOSURE.sub(password, text)
+        return text, detections
+
+    def looks_like_secret(self, value: str, quoted: bool = False) -> bool:
+        """
+        Valeur après "mot de passe est / password is" : secret probable si
+        citée, mêlant lettres et chiffres, avec symboles, ou hors vocabulaire ;
+        jamais pour une négation ou un état ("pas", "incorrect", "expiré"...)
+        """
+        word = fold(value).strip(".?!:-()")
+        if len(word) < 3 or word in NOT_SECRET:
+            return False
+        if quoted or (any(c.isdigit() for c in word) and any(c.isalpha() for c in word)):
+            return True
+
+        parts = word.split("-")
+        if all(part.isalpha() for part in parts):
+            return not all(part in self.vocabulary for part in parts)
+        # Chiffres seuls ou symboles : 123456, P@ss!
+        return True
+
+    # --------------------------------------------------
+    # Colère
+    # --------------------------------------------------
+    def anger_signals(self, text: str) -> List[str]:
+        """
+        Signaux décisifs : terme de colère ou menace, ou marqueur de
+        frustration accompagné de cris. Un marqueur seul, ou des cris seuls,
+        ne tranchent pas : le ticket passe par le triage LLM.
+        """
+        folded = fold(text)
+        signals = list(dict.fromkeys(match.group() for match in ANGER_PATTERN.finditer(folded)))
+        frustration = list(dict.fromkeys(match.group() for match in FRUSTRATION_PATTERN.finditer(folded)))
+
+        if frustration and self._is_shouting(text):
+            signals += frustration + ["majuscules et points d'exclamation"]
+        return signals
+
+    @staticmethod
+    def _is_shouting(text: str) -> bool:
+        letters = [c for c in text if c.isalpha()]
+        uppercase = sum(c.isupper() for c in letters) / len(letters) if letters else 0.0
+        return len(letters) >= 10 and uppercase > 0.6 and text.count("!") >= 3
+
+    # --------------------------------------------------
+    # Charabia
+    # --------------------------------------------------
+    def is_gibberish(self, text: str) -> bool:
+        # fold() ne garde que l'ASCII : un texte en autre alphabet ou sans mot
+        # latin (code d'erreur seul...) ne peut pas être jugé ici
+        if self._has_non_latin_letters(text):
+            return False
+
+        words = WORD.findall(fold(text))
+        if len("".join(words)) < MIN_JUDGED_LETTERS:
+            return False
+
+        known = sum(word in self.vocabulary for word in words) / len(words)
+        if known >= self.min_known_ratio:
+            return False
+
+        unknown = [word for word in words if word not in self.vocabulary]
+        suspicious = sum(
+            bool(CONSONANT_RUN.search(word)) or self._vowel_ratio(word) < 0.2
+            for word in unknown
+        ) / len(unknown)
+
+        letters = "".join(words)
+        return suspicious >= 0.5 or (len(letters) >= 8 and self._entropy(letters) < self.min_entropy)
+
+    @staticmethod
+    def _has_non_latin_letters(text: str) -> bool:
+        return any(c.isalpha() and not unicodedata.name(c, "").startswith("LATIN") for c in text)
+
+    @staticmethod
+    def _vowel_ratio(word: str) -> float:
+        return sum(c in "aeiouy" for c in word) / len(word)
+
+    @staticmethod
+    def _entropy(text: str) -> float:
+        counts = Counter(text)
+        return -sum(n / len(text) * math.log2(n / len(text)) for n in counts.values())
+
+
+if __name__ == "__main__":
+    # Exemples de non-régression (question, tranché sans LLM, exceptions attendues)
+    examples = [
+        ("Mon mot de passe est incorrect, que faire ?", False, []),
+        ("Le mot de passe est refusé depuis ce matin", False, []),
+        ("Mon mot de passe est trop court ?", False, []),
+        ("My password is not working", False, []),
+        ("Comment réinitialiser mon mot de passe oublié ?", False, []),
+        ("Mon mot de passe est Soleil2024, je n'arrive pas à me connecter", True, ["data_sensitive"]),
+        ("mdp : 'bonjour'", True, ["data_sensitive"]),
+        ("Le mot de passe c'est 123456", True, ["data_sensitive"]),
+        ("Ma carte 4111 1111 1111 1111 a été débitée deux fois", True, ["data_sensitive"]),
+        ("Rappelez-moi au 0555 12 34 56", True, ["data_sensitive"]),
+        ("L'export ne fonctionne toujours pas", False, []),
+        ("Encore une fois merci pour votre aide", False, []),
+        ("C'est la honte, j'en ai marre de ce bug", False, []),
+        ("L'EXPORT NE MARCHE PAS !!!", False, []),
+        ("ENCORE UNE FOIS L'EXPORT PLANTE, C'EST TOUJOURS PAS CORRIGÉ !!!", True, ["emotion_negative"]),
+        ("Je suis furieux, l'export plante depuis hier", True, ["emotion_negative"]),
+        ("Si rien n'est fait je vais porter plainte", True, ["emotion_negative"]),
+        ("كيف يمكنني تفعيل المصادقة الثنائية في حسابي؟", False, []),
+        ("Как экспортировать проект?", False, []),
+        ("500 ?", False, []),
+        ("sdfghjkl qwrtzp", True, []),
+    ]
+
+    pre_triage = PreTriage()
+    failures = 0
+    for question, decisive, exceptions in examples:
+        result = pre_triage.analyze(question)
+        ok = result["decisive"] == decisive and result["exceptions"] == exceptions
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {question!r} → {result['reasoning']} | {result['question_redacted']}")
+
+    print(f"\n{len(examples) - failures}/{len(examples)} exemples conformes")
+    if failures:
+        raise SystemExit(1)
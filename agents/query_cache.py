@@ -0,0 +1,136 @@
+# agents/query_cache.py
+"""
+Cache LRU des embeddings de requêtes
+
+Clé     : SHA-1 du texte normalisé (espaces, Unicode NFC), un cache par modèle
+Valeur  : vecteur float32 normalisé L2 (prêt pour la recherche cosinus)
+Option  : déversement sur disque (.npz) pour survivre aux redémarrages
+"""
+
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from agents.embedding_cache import EmbeddingCache
+
+
+class QueryEmbeddingCache:
+    """
+    Cache borné et thread-safe des requêtes encodées, partagé par la
+    recherche et le reranking : une reformulation fréquente ("Erreur 500")
+    n'est encodée qu'une fois
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_size: int = 1024,
+        spill_path: Optional[str] = None,
+        spill_every: int = 64
+    ):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.spill_every = spill_every
+
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.spill_path is not None and self.spill_path.exists():
+            self._load()
+
+    def encode(self, queries: List[str], embedder) -> np.ndarray:
+        """
+        Équivalent de embedder.encode(queries) suivi de normalize_L2 : seules
+        les requêtes absentes du cache sont encodées, en un seul batch.
+        Retourne une copie (modifiable par l'appelant).
+        """
+        keys = [EmbeddingCache.key(query) for query in queries]
+        found: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+
+        with self._lock:
+            for key, query in zip(keys, queries):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                elif key not in missing:
+                    missing[key] = query
+            self.hits += len(queries) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            embeddings = np.asarray(embedder.encode(list(missing.values()), convert_to_numpy=True), dtype="float32")
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms > 0, norms, 1.0)
+
+            for key, vector in zip(missing, embeddings):
+                found[key] = vector
+            self._store(dict(zip(missing, embeddings)))
+
+        return np.array([found[key] for key in keys], dtype="float32")
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+            self._unsaved += len(vectors)
+            spill = self.spill_path is not None and self._unsaved >= self.spill_every
+
+        if spill:
+            self.save()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --------------------------------------------------
+    # Déversement sur disque
+    # --------------------------------------------------
+    def save(self):
+        """Écrit le cache (ordre LRU conservé) dans spill_path, de façon atomique"""
+        if self.spill_path is None:
+            return
+
+        with self._lock:
+            keys = list(self._entries)
+            vectors = np.array(list(self._entries.values()), dtype="float32")
+            self._unsaved = 0
+
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.spill_path.with_name(self.spill_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, model=np.array(self.model_name), keys=np.array(keys), vectors=vectors)
+        tmp_path.replace(self.spill_path)
+
+    def _load(self):
+        try:
+            with np.load(self.spill_path) as data:
+                if str(data["model"]) != self.model_name:
+                    return
+                keys, vectors = data["keys"], data["vectors"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cache de requêtes illisible ({e}) : ignoré")
+            return
+
+        for key, vector in list(zip(keys.tolist(), vectors))[-self.max_size:]:
+            self._entries[key] = vector
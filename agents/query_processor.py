@@ -1,75 +1,104 @@
 # agents/query_processor.py
 import json
+from typing import Optional
 from agno.agent import Agent
 from agno.models.mistral import MistralChat
 
+from agents.doc_registry import DOC_KEYS
+from agents.llm_cache import CachedAgent, LLMCache
+
+# --------------------------------------------------
+# Instructions (partagées avec le FusedAnalyzer)
+# --------------------------------------------------
+DOXA_CONTEXT = "🎯 CONTEXTE : Doxa = plateforme SaaS gestion projets (Kanban, Agile, Waterfall)."
+
+QUERY_MISSION = [
+    "- Résumé (<100 mots)",
+    "- 5-10 mots-clés",
+    "- Reformulation claire",
+    "- Catégorie précise",
+    "- Documents KB suggérés",
+    "- Score confiance",
+]
+
+QUERY_CATEGORIES = [
+    "🗂️ CATÉGORIES :",
+    "1. technique (bugs, erreurs)",
+    "2. authentification (login, 2FA)",
+    "3. projets_taches (création, gestion)",
+    "4. collaboration (commentaires, @mentions)",
+    "5. integrations (Slack, GitHub, API)",
+    "6. facturation (plans, paiement)",
+    "7. securite (2FA, conformité)",
+    "8. onboarding (démarrage)",
+    "9. general (FAQ)",
+]
+
+QUERY_DOCUMENTS = [
+    "📚 DOCUMENTS KB :",
+    "- troubleshooting (bugs, erreurs)",
+    "- guide_securite (2FA, permissions)",
+    "- tarification (plans, prix)",
+    "- guide_utilisateur (projets, tâches)",
+    "- guide_onboarding (démarrage)",
+    "- faq (questions générales)",
+    "- conditions_generales (CGU, lois)",
+]
+
+QUERY_CATEGORY_DOCUMENTS = [
+    "🎯 MAPPING CATÉGORIE → DOCUMENTS :",
+    "technique → troubleshooting + faq",
+    "authentification → troubleshooting + guide_securite",
+    "projets_taches → guide_utilisateur + troubleshooting",
+    "collaboration → guide_utilisateur + faq",
+    "integrations → guide_utilisateur + troubleshooting",
+    "facturation → tarification + conditions_generales",
+    "securite → guide_securite + conditions_generales",
+    "onboarding → guide_onboarding + guide_utilisateur",
+    "general → faq + guide_utilisateur",
+]
+
+QUERY_JSON_FIELDS = [
+    '"resume": "...",',
+    '"mots_cles": ["mot1", "mot2", ...],',
+    '"reformulation": "...",',
+    '"categorie": "...",',
+    '"documents": ["doc1", "doc2"],',
+    '"confidence": 0.85,',
+    '"reasoning": "..."',
+]
+
 
 class SmartQueryProcessor:
     """
     Agent UNIFIÉ : Analyse + Classification Doxa
     """
     
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, llm_cache: Optional[LLMCache] = None):
+        self.agent = CachedAgent(Agent(
             name="Doxa Smart Query Processor",
             model=MistralChat(id="mistral-small-latest"),
             description="Processeur intelligent de requêtes support Doxa",
             instructions=[
-                "🎯 CONTEXTE : Doxa = plateforme SaaS gestion projets (Kanban, Agile, Waterfall).",
+                DOXA_CONTEXT,
                 "",
                 "📋 TA MISSION :",
                 "Produire un JSON avec :",
-                "- Résumé (<100 mots)",
-                "- 5-10 mots-clés",
-                "- Reformulation claire",
-                "- Catégorie précise",
-                "- Documents KB suggérés",
-                "- Score confiance",
+                *QUERY_MISSION,
                 "",
-                "🗂️ CATÉGORIES :",
-                "1. technique (bugs, erreurs)",
-                "2. authentification (login, 2FA)",
-                "3. projets_taches (création, gestion)",
-                "4. collaboration (commentaires, @mentions)",
-                "5. integrations (Slack, GitHub, API)",
-                "6. facturation (plans, paiement)",
-                "7. securite (2FA, conformité)",
-                "8. onboarding (démarrage)",
-                "9. general (FAQ)",
+                *QUERY_CATEGORIES,
                 "",
-                "📚 DOCUMENTS KB :",
-                "- troubleshooting (bugs, erreurs)",
-                "- guide_securite (2FA, permissions)",
-                "- tarification (plans, prix)",
-                "- guide_utilisateur (projets, tâches)",
-                "- guide_onboarding (démarrage)",
-                "- faq (questions générales)",
-                "- conditions_generales (CGU, lois)",
+                *QUERY_DOCUMENTS,
                 "",
-                "🎯 MAPPING CATÉGORIE → DOCUMENTS :",
-                "technique → troubleshooting + faq",
-                "authentification → troubleshooting + guide_securite",
-                "projets_taches → guide_utilisateur + troubleshooting",
-                "collaboration → guide_utilisateur + faq",
-                "integrations → guide_utilisateur + troubleshooting",
-                "facturation → tarification + conditions_generales",
-                "securite → guide_securite + conditions_generales",
-                "onboarding → guide_onboarding + guide_utilisateur",
-                "general → faq + guide_utilisateur",
+                *QUERY_CATEGORY_DOCUMENTS,
                 "",
                 "📤 FORMAT RÉPONSE (JSON strict) :",
                 "{",
-                '  "resume": "...",',
-                '  "mots_cles": ["mot1", "mot2", ...],',
-                '  "reformulation": "...",',
-                '  "categorie": "...",',
-                '  "documents": ["doc1", "doc2"],',
-                '  "confidence": 0.85,',
-                '  "reasoning": "..."',
+                *("  " + field for field in QUERY_JSON_FIELDS),
                 "}"
             ],
             markdown=False
-        )
+        ), llm_cache)
     
     def process(self, question: str, triage_data: dict) -> dict:
         prompt = f"""Analyse cette requête support Doxa :
@@ -99,6 +128,7 @@ Réponds UNIQUEMENT avec le JSON demandé."""
                 result = json.loads(json_str)
                 result['question_originale'] = question
                 result = self._validate_response(result)
+                self.agent.remember(prompt, response)
                 return result
             else:
                 return self._fallback_response(question, triage_data)
@@ -114,11 +144,7 @@ Réponds UNIQUEMENT avec le JSON demandé."""
             'securite', 'onboarding', 'general'
         ]
         
-        docs_valides = [
-            'troubleshooting', 'guide_securite', 'tarification',
-            'guide_utilisateur', 'guide_onboarding', 'faq',
-            'conditions_generales'
-        ]
+        docs_valides = DOC_KEYS
         
         if result.get('categorie') not in categories_valides:
             result['categorie'] = 'general'
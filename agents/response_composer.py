@@ -6,9 +6,12 @@ Critère 7 (8%) : Qualité réponses (zéro hallucination, ton professionnel)
 """
 
 import json
+from typing import Optional
 import re
 from agno.agent import Agent
 from agno.models.mistral import MistralChat
+
+from agents.llm_cache import CachedAgent, LLMCache
 from dotenv import load_dotenv
 
 
@@ -20,8 +23,8 @@ class ResponseComposer:
     Génère des réponses dans la langue du client avec template strict
     """
     
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, llm_cache: Optional[LLMCache] = None):
+        self.agent = CachedAgent(Agent(
             name="Doxa Response Composer",
             model=MistralChat(id="mistral-small-latest", temperature=0.3),
             description="Agent de génération de réponses support structurées",
@@ -105,7 +108,7 @@ class ResponseComposer:
                 "• Si vous rencontrez un problème : contactez security@doxa.dz",
             ],
             markdown=False
-        )
+        ), llm_cache)
     
     def compose(
         self,
@@ -124,7 +127,8 @@ class ResponseComposer:
             evaluation: Résultat de l'évaluation (optionnel)
             
         Returns:
-            dict avec response, langue, confidence
+            dict avec response, langue, confidence, provenance (llm, ou
+            secours si le LLM a échoué)
         """
         
         # Détecter la langue
@@ -157,6 +161,8 @@ Réponds directement avec le texte de la réponse (pas de JSON, pas de ```).
             
             # Validation qualité
             quality_check = self._check_quality(response_text, context)
+            if response_text:
+                self.agent.remember(prompt, response)
             
             return {
                 "response": response_text,
@@ -164,7 +170,8 @@ Réponds directement avec le texte de la réponse (pas de JSON, pas de ```).
                 "quality_score": quality_check['score'],
                 "quality_issues": quality_check['issues'],
                 "word_count": len(response_text.split()),
-                "has_structure": self._has_structure(response_text)
+                "has_structure": self._has_structure(response_text),
+                "provenance": "llm"
             }
         
         except Exception as e:
@@ -287,7 +294,8 @@ Réponds directement avec le texte de la réponse (pas de JSON, pas de ```).
             "quality_score": 0.5,
             "quality_issues": ["Réponse de secours utilisée"],
             "word_count": 50,
-            "has_structure": True
+            "has_structure": True,
+            "provenance": "secours"
         }
 
 
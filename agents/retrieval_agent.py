@@ -1,7 +1,31 @@
 # agents/retrieval_agent.py
 import faiss
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from agents.bm25_index import tokenize
+from agents.chunk_store import ChunkHit
+from agents.cross_encoder_reranker import CrossEncoderReranker
+from agents.query_cache import QueryEmbeddingCache
+from agents.shard_router import ShardRouter
+
+
+# Filtrage par document :
+# - selector : sélecteur FAISS (plage ou bitmap) appliqué pendant la recherche
+# - shards   : un sous-index par document + routeur de centroïdes
+# - post     : sur-échantillonnage de l'index global puis filtrage
+FILTER_MODES = ("selector", "shards", "post")
+
+# Classement :
+# - dense  : similarité cosinus seule (FAISS + reranking)
+# - hybrid : fusion (Reciprocal Rank Fusion) du classement dense et du BM25
+RETRIEVAL_MODES = ("dense", "hybrid")
+
+# Coût estimé (tokens) de l'en-tête de chaque extrait dans le contexte
+CONTEXT_HEADER_TOKENS = 24
+
+# Reste d'un passage tronqué (caractères utiles) en dessous duquel il est écarté
+MIN_EXTRACT_CHARS = 40
 
 
 class RetrievalAgent:
@@ -9,12 +33,77 @@ class RetrievalAgent:
     Agent de recherche avec augmentation de requête
     """
     
-    def __init__(self, document_processor):
+    def __init__(
+        self,
+        document_processor,
+        filter_mode: str = "selector",
+        max_shards: int = 8,
+        query_cache_size: int = 1024,
+        query_cache_path: Optional[str] = None,
+        retrieval_mode: str = "hybrid",
+        rrf_k: int = 60,
+        cross_encoder_model: Optional[str] = None,
+        rerank_budget_ms: float = 150.0,
+        context_budget_tokens: int = 1500,
+        mmr_lambda: float = 0.7,
+        snippet_sentences: int = 2,
+        snippet_window: int = 1,
+        expand_neighbours: int = 2,
+        semantic_neighbours: int = 2,
+        neighbour_min_ratio: float = 0.8
+    ):
+        if filter_mode not in FILTER_MODES:
+            raise ValueError(f"filter_mode inconnu : {filter_mode} (attendu : {', '.join(FILTER_MODES)})")
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode inconnu : {retrieval_mode} (attendu : {', '.join(RETRIEVAL_MODES)})")
+        
         self.doc_processor = document_processor
         self.embedder = document_processor.embedder
         self.index = document_processor.index
-        self.documents = document_processor.documents
-        self.metadata = document_processor.metadata
+        self.chunks = document_processor.chunks
+        self.filter_mode = filter_mode
+        
+        # Index BM25 construit à l'ingestion ; sans lui, recherche dense seule
+        self.lexical_index = document_processor.lexical_index
+        self.retrieval_mode = retrieval_mode if self.lexical_index is not None else "dense"
+        self.rrf_k = rrf_k
+        
+        # Reranking cross-encoder (optionnel) : score de pertinence sous budget de latence
+        self.cross_encoder = None
+        if cross_encoder_model:
+            self.cross_encoder = CrossEncoderReranker(cross_encoder_model, budget_ms=rerank_budget_ms)
+        
+        # Embeddings de requêtes : cache LRU commun à la recherche et au reranking
+        self.query_cache = QueryEmbeddingCache(
+            document_processor.embedding_model,
+            max_size=query_cache_size,
+            spill_path=query_cache_path
+        )
+        
+        # Sous-index par document : le filtre par source précède le classement
+        self.shards = None
+        if filter_mode == "shards" and self.index is not None and len(self.chunks):
+            self.shards = ShardRouter(self.chunks, document_processor.chunk_vectors(), max_shards)
+        
+        # Paramètres de recherche filtrée par périmètre (ensemble de sources)
+        self._scope_cache: Dict[Tuple[str, ...], Tuple] = {}
+        
+        # Contexte du Response Composer : diversité MMR sous budget de tokens
+        self.context_budget_tokens = context_budget_tokens
+        self.mmr_lambda = mmr_lambda
+        
+        # Extraits ciblés : meilleures phrases de chaque chunk (+ voisines),
+        # si le sous-index de phrases a été construit
+        self.sentence_index = document_processor.sentence_index
+        self.snippet_sentences = snippet_sentences
+        self.snippet_window = snippet_window
+        
+        # Voisins des meilleurs résultats (table précalculée) : chunk suivant /
+        # précédent et plus proches voisins, gardés s'ils restent pertinents
+        self.neighbour_table = document_processor.neighbour_table
+        self.expand_neighbours = expand_neighbours
+        self.semantic_neighbours = semantic_neighbours
+        self.neighbour_min_ratio = neighbour_min_ratio
     
     def retrieve(
         self, 
@@ -30,26 +119,59 @@ class RetrievalAgent:
         else:
             augmented_queries = [query_data['reformulation']]
         
-        # Retrieval Multiple
-        all_results = []
-        for query in augmented_queries:
-            results = self._search_faiss(
-                query=query,
+        # Retrieval Multiple : un seul encodage et une seule recherche FAISS
+        # pour toutes les requêtes augmentées
+        query_embs = self._encode_queries(augmented_queries)
+        scores, indices = self._search_batch(
+            query_embs,
+            selected_docs=query_data.get('documents', []),
+            top_k=top_k * 2
+        )
+        
+        # Fusion + déduplication sur les matrices de résultats
+        deduplicated = self._fuse_results(scores, indices)
+        
+        # Candidats lexicaux (tokens exacts : codes d'erreur, noms de plans...)
+        lexical_hits, lexical_only = [], []
+        if self.retrieval_mode == "hybrid":
+            lexical_hits = self._lexical_search(
+                query_data,
                 selected_docs=query_data.get('documents', []),
                 top_k=top_k * 2
             )
-            all_results.extend(results)
-        
-        # Déduplication
-        deduplicated = self._deduplicate_results(all_results)
+            known = {hit.idx for hit in deduplicated}
+            lexical_only = [hit for hit in lexical_hits if hit.idx not in known]
+            deduplicated += lexical_only
         
-        # Reranking
+        # Reranking (la reformulation est la première requête encodée)
         reranked = self._rerank_results(
             query_data['reformulation'],
-            deduplicated
+            deduplicated,
+            query_emb=query_embs[:1]
         )
         
-        final_results = reranked[:top_k]
+        # Candidats purement lexicaux : score de similarité = cosinus du reranking
+        for hit in lexical_only:
+            hit['score'] = hit['rerank_score']
+        
+        if lexical_hits:
+            reranked = self._reciprocal_rank_fusion(reranked, lexical_hits)
+        
+        # Pertinence (requête, chunk) des meilleurs candidats
+        if self.cross_encoder is not None:
+            reranked = self.cross_encoder.rerank(query_data['reformulation'], reranked)
+        
+        # Voisins des meilleurs chunks : lecture de table, sans recherche
+        if self.neighbour_table is not None and self.expand_neighbours:
+            reranked = self._expand_neighbours(reranked, query_embs[0], top_k)
+        
+        # Sélection MMR sous budget de tokens, recouvrements retirés
+        final_results, context_tokens = self._pack_context(reranked, top_k, query_embs[0])
+        
+        # Extraits finaux sans pertinence (coupés par le budget, voisins) :
+        # scorés aussi, pour que avg_score reste sur l'échelle du cross-encoder
+        if self.cross_encoder is not None:
+            self.cross_encoder.score_missing(query_data['reformulation'], final_results)
         
         # Construction contexte
         context = self._build_context(final_results)
@@ -59,9 +181,21 @@ class RetrievalAgent:
             "context": context,
             "sources": list(set([r['source'] for r in final_results])),
             "num_chunks": len(final_results),
-            "avg_score": sum(r['score'] for r in final_results) / len(final_results) if final_results else 0.0
+            "context_tokens": context_tokens,
+            "avg_score": self._average_score(final_results)
         }
     
+    def _average_score(self, results: List[ChunkHit]) -> float:
+        """
+        Score moyen des extraits : pertinence du cross-encoder s'il est actif
+        (uniquement les extraits scorés, jamais mélangée au cosinus), cosinus sinon
+        """
+        if self.cross_encoder is not None:
+            scores = [r.relevance_score for r in results if r.relevance_score is not None]
+        else:
+            scores = [r['score'] for r in results]
+        return sum(scores) / len(scores) if scores else 0.0
+    
     def _augment_query(self, query_data: dict) -> List[str]:
         base_query = query_data['reformulation']
         keywords = query_data.get('mots_cles', [])
@@ -90,69 +224,179 @@ class RetrievalAgent:
         
         return list(dict.fromkeys(augmented))
     
-    def _search_faiss(self, query: str, selected_docs: List[str], top_k: int) -> List[Dict]:
-        query_emb = self.embedder.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(query_emb)
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Vecteurs normalisés des requêtes : cache LRU, puis un seul passage du modèle pour les absentes"""
+        return self.query_cache.encode(queries, self.embedder)
+    
+    def _search_faiss(self, query: str, selected_docs: List[str], top_k: int) -> List[ChunkHit]:
+        scores, indices = self._search_batch(self._encode_queries([query]), selected_docs, top_k)
+        valid = indices[0] != -1
+        return [
+            self.chunks.hit(idx, score)
+            for idx, score in zip(indices[0][valid], scores[0][valid])
+        ]
+    
+    def _lexical_search(self, query_data: dict, selected_docs: List[str], top_k: int) -> List[ChunkHit]:
+        """
+        Recherche BM25 sur la reformulation, la question d'origine et les
+        mots-clés, restreinte aux documents sélectionnés
+        """
+        terms = tokenize(' '.join([
+            query_data.get('reformulation', ''),
+            query_data.get('question_originale', ''),
+            *query_data.get('mots_cles', [])
+        ]))
         
-        scores, indices = self.index.search(query_emb, top_k * 3)
+        sources = self.chunks.resolve_sources(selected_docs) if selected_docs else []
+        mask = self.chunks.source_mask(sources) if sources else None
         
-        filtered_results = []
+        positions, scores = self.lexical_index.search(' '.join(dict.fromkeys(terms)), top_k, mask=mask)
         
-        for idx, score in zip(indices[0], scores[0]):
-            if idx == -1:
-                continue
-            
-            meta = self.metadata[idx]
+        hits = []
+        for idx, score in zip(positions, scores):
+            hit = self.chunks.hit(idx, 0.0)
+            hit['lexical_score'] = float(score)
+            hits.append(hit)
+        return hits
+    
+    def _reciprocal_rank_fusion(self, dense_ranked: List[ChunkHit], lexical_hits: List[ChunkHit]) -> List[ChunkHit]:
+        """
+        Reciprocal Rank Fusion : score = Σ 1 / (rrf_k + rang) sur le classement
+        dense (après reranking) et le classement BM25. Le score cosinus des
+        hits reste celui du reranking (seuils de l'évaluateur inchangés).
+        """
+        fused = {}
+        for rank, hit in enumerate(dense_ranked, 1):
+            fused[hit.idx] = 1.0 / (self.rrf_k + rank)
+        
+        lexical_scores = {}
+        for rank, hit in enumerate(lexical_hits, 1):
+            fused[hit.idx] += 1.0 / (self.rrf_k + rank)
+            lexical_scores[hit.idx] = hit.lexical_score
+        
+        for hit in dense_ranked:
+            if hit.idx in lexical_scores:
+                hit['lexical_score'] = lexical_scores[hit.idx]
+        
+        return sorted(dense_ranked, key=lambda hit: fused[hit.idx], reverse=True)
+    
+    def _search_batch(self, query_embs: np.ndarray, selected_docs: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Recherche multi-requêtes (une ligne par requête), même contrat que
+        index.search : (scores, positions), -1 quand il manque des résultats
+        """
+        # Clés du Query Processor (faq, troubleshooting...) → sources indexées
+        sources = self.chunks.resolve_sources(selected_docs) if selected_docs else []
+        if not sources:
+            return self.index.search(query_embs, top_k)
+        
+        if self.filter_mode == "post":
+            scores, indices = self._post_filter(query_embs, sources, top_k)
+        elif self.shards is not None:
+            scores, indices = self.shards.search(query_embs, sources, top_k)
+        else:
+            scores, indices = self.index.search(query_embs, top_k, params=self._scope_params(sources))
+        
+        # Requêtes sans résultat dans le périmètre (ex. listes IVF non sondées) :
+        # résultats de la recherche globale
+        empty = (indices == -1).all(axis=1)
+        if empty.any():
+            scores[empty], indices[empty] = self.index.search(query_embs[empty], top_k)
+        
+        return scores, indices
+    
+    def _post_filter(self, query_embs: np.ndarray, sources: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sur-échantillonnage de l'index global puis filtrage par source"""
+        scores, indices = self.index.search(query_embs, top_k * 3)
+        
+        # Filtrage par source : masque vectorisé sur la table de chunks
+        allowed = (indices != -1) & self.chunks.source_mask(sources)[indices]
+        order = np.argsort(~allowed, axis=1, kind="stable")[:, :top_k]
+        
+        allowed = np.take_along_axis(allowed, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        indices = np.where(allowed, np.take_along_axis(indices, order, axis=1), -1)
+        return scores, indices
+    
+    def _scope_params(self, sources: List[str]) -> faiss.SearchParameters:
+        """
+        Paramètres FAISS limitant la recherche aux chunks des sources données :
+        IDSelectorRange si ces chunks sont contigus, IDSelectorBitmap sinon.
+        Mis en cache par périmètre (le bitmap doit survivre au sélecteur).
+        """
+        key = tuple(sorted(sources))
+        if key not in self._scope_cache:
+            mask = self.chunks.source_mask(sources)
+            positions = np.flatnonzero(mask)
             
-            if not selected_docs or meta['source'] in selected_docs:
-                filtered_results.append({
-                    "text": self.documents[idx],
-                    "source": meta['source'],
-                    "chunk_id": meta['chunk_id'],
-                    "score": float(score),
-                    "idx": int(idx)
-                })
+            bits = None
+            if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+                selector = faiss.IDSelectorRange(int(positions[0]), int(positions[-1]) + 1)
+            else:
+                bits = np.packbits(mask, bitorder="little")
+                selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
             
-            if len(filtered_results) >= top_k:
-                break
-        
-        if not filtered_results and selected_docs:
-            for idx, score in zip(indices[0][:top_k], scores[0][:top_k]):
-                if idx == -1:
-                    continue
-                meta = self.metadata[idx]
-                filtered_results.append({
-                    "text": self.documents[idx],
-                    "source": meta['source'],
-                    "chunk_id": meta['chunk_id'],
-                    "score": float(score),
-                    "idx": int(idx)
-                })
-        
-        return filtered_results
-    
-    def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
-        seen = {}
-        
-        for result in results:
-            key = f"{result['source']}_{result['chunk_id']}"
+            # nprobe / efSearch de l'index conservés
+            if isinstance(self.index, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF()
+                params.nprobe = self.index.nprobe
+            elif isinstance(self.index, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW()
+                params.efSearch = self.index.hnsw.efSearch
+            else:
+                params = faiss.SearchParameters()
+            params.sel = selector
             
-            if key not in seen or result['score'] > seen[key]['score']:
-                seen[key] = result
+            self._scope_cache[key] = (params, selector, bits)
         
-        return sorted(seen.values(), key=lambda x: x['score'], reverse=True)
+        return self._scope_cache[key][0]
     
-    def _rerank_results(self, original_query: str, results: List[Dict]) -> List[Dict]:
+    def _fuse_results(self, scores: np.ndarray, indices: np.ndarray) -> List[ChunkHit]:
+        """
+        Fusion des résultats de toutes les requêtes : un chunk n'est gardé
+        qu'une fois, avec son meilleur score, tri par score décroissant
+        """
+        valid = indices != -1
+        ids = indices[valid]
+        hit_scores = scores[valid]
+        
+        # Regroupement par chunk, meilleur score en tête de chaque groupe
+        order = np.lexsort((-hit_scores, ids))
+        ids, hit_scores = ids[order], hit_scores[order]
+        first = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else ids
+        ids, hit_scores = ids[first], hit_scores[first]
+        
+        ranking = np.argsort(-hit_scores, kind="stable")
+        return [
+            self.chunks.hit(idx, score)
+            for idx, score in zip(ids[ranking], hit_scores[ranking])
+        ]
+    
+    def _chunk_vectors(self, results: List[ChunkHit]) -> np.ndarray:
+        """
+        Vecteurs normalisés des résultats, sans ré-encodage : relus dans
+        l'index, ou dans le cache d'embeddings pour IVF-PQ (seuls les
+        chunks absents du cache sont encodés)
+        """
+        return self.doc_processor.chunk_vectors(np.array([r.idx for r in results], dtype="int64"))
+    
+    def _rerank_results(
+        self,
+        original_query: str,
+        results: List[ChunkHit],
+        query_emb: Optional[np.ndarray] = None
+    ) -> List[ChunkHit]:
+        """
+        Rescoring cosinus par rapport à la requête d'origine : produit matriciel
+        entre le vecteur de requête (déjà calculé) et les vecteurs stockés
+        """
         if not results:
             return results
         
-        query_emb = self.embedder.encode([original_query], convert_to_numpy=True)
-        faiss.normalize_L2(query_emb)
-        
-        texts = [r['text'] for r in results]
-        chunk_embs = self.embedder.encode(texts, convert_to_numpy=True)
-        faiss.normalize_L2(chunk_embs)
+        if query_emb is None:
+            query_emb = self._encode_queries([original_query])
         
+        chunk_embs = self._chunk_vectors(results)
         similarities = np.dot(chunk_embs, query_emb.T).flatten()
         
         for i, result in enumerate(results):
@@ -160,6 +404,189 @@ class RetrievalAgent:
         
         return sorted(results, key=lambda x: x['rerank_score'], reverse=True)
     
+    def _expand_neighbours(self, results: List[ChunkHit], query_emb: np.ndarray, top_k: int) -> List[ChunkHit]:
+        """
+        Voisins des `expand_neighbours` premiers résultats, lus dans la table :
+        - le chunk suivant (ou précédent) quand les phrases pertinentes
+          touchent cette frontière, inséré juste après le chunk d'origine
+        - ses plus proches voisins sémantiques, placés après les top_k
+          premiers résultats (candidats de complément pour le MMR)
+        Un voisin n'est gardé que si sa similarité à la requête atteint
+        neighbour_min_ratio × celle du chunk d'origine.
+        """
+        present = {hit.idx for hit in results}
+        proposals: List[Tuple[int, int, int]] = []  # (rang du chunk d'origine, rang d'insertion, voisin)
+        
+        for rank, hit in enumerate(results[:self.expand_neighbours]):
+            previous, following = self._boundary_neighbours(hit, query_emb)
+            candidates = [(rank, following), (rank, previous)]
+            for idx in self.neighbour_table.semantic(hit.idx, self.semantic_neighbours).tolist():
+                candidates.append((max(rank, top_k - 1), idx))
+            
+            for insert_rank, idx in candidates:
+                if idx >= 0 and idx not in present:
+                    present.add(idx)
+                    proposals.append((rank, insert_rank, idx))
+        
+        if not proposals:
+            return results
+        
+        neighbours = [self.chunks.hit(idx, 0.0) for _, _, idx in proposals]
+        similarities = self._chunk_vectors(neighbours) @ query_emb
+        
+        inserted: Dict[int, List[ChunkHit]] = {}
+        for (rank, insert_rank, _), neighbour, similarity in zip(proposals, neighbours, similarities):
+            parent = results[rank]
+            if similarity < self.neighbour_min_ratio * parent.get('rerank_score', parent['score']):
+                continue
+            neighbour['score'] = float(similarity)
+            neighbour['rerank_score'] = float(similarity)
+            inserted.setdefault(insert_rank, []).append(neighbour)
+        
+        expanded = []
+        for rank, hit in enumerate(results):
+            expanded.append(hit)
+            expanded.extend(inserted.pop(rank, []))
+        # Résultats moins nombreux que top_k : voisins restants en fin de liste
+        for neighbours_left in inserted.values():
+            expanded.extend(neighbours_left)
+        return expanded
+    
+    def _boundary_neighbours(self, hit: ChunkHit, query_emb: np.ndarray) -> Tuple[int, int]:
+        """
+        (précédent, suivant) utiles : avec le sous-index de phrases, seulement
+        du côté où les phrases les plus pertinentes touchent le bord du chunk
+        """
+        previous, following = self.neighbour_table.sequential(hit.idx)
+        if self.sentence_index is None:
+            return previous, following
+        
+        spans = self.sentence_index.snippet(hit.idx, query_emb, self.snippet_sentences, self.snippet_window)
+        if not spans:
+            return previous, following
+        
+        start, end = self.chunks.span(hit.idx)
+        return (
+            previous if spans[0][0] == start else -1,
+            following if spans[-1][1] == end else -1
+        )
+    
+    def _pack_context(self, results: List[ChunkHit], top_k: int, query_emb: np.ndarray) -> Tuple[List[ChunkHit], int]:
+        """
+        Maximal Marginal Relevance sous budget de tokens :
+        λ · pertinence − (1 − λ) · similarité max aux extraits déjà retenus,
+        la pertinence suivant l'ordre des résultats reçus.
+        Chaque chunk est réduit à ses meilleures phrases (sous-index de
+        phrases) et privé des passages déjà présents dans un extrait retenu
+        (fenêtre d'overlap du chunking) ; un candidat qui ne tient pas dans
+        le budget est écarté au profit des suivants. Le premier est toujours gardé.
+        """
+        candidates = results[:top_k * 2]
+        if not candidates:
+            return [], 0
+        
+        vectors = self._chunk_vectors(candidates)
+        # Pertinence = rang du classement amont (RRF, cross-encoder...), ramené à ]0, 1]
+        relevance = 1.0 - np.arange(len(candidates), dtype="float32") / len(candidates)
+        
+        selected: List[ChunkHit] = []
+        max_similarity = np.full(len(candidates), -np.inf, dtype="float32")
+        available = np.ones(len(candidates), dtype=bool)
+        used_tokens = 0
+        
+        while available.any() and len(selected) < top_k:
+            redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(available, mmr, -np.inf)))
+            available[best] = False
+            
+            hit = candidates[best]
+            spans = self._trim_overlap(hit, self._snippet_spans(hit, query_emb), selected)
+            if not spans:
+                continue
+            
+            tokens = self._span_tokens(hit, spans) + CONTEXT_HEADER_TOKENS
+            if selected and used_tokens + tokens > self.context_budget_tokens:
+                continue
+            
+            if spans != [self.chunks.span(hit.idx)]:
+                hit.spans = spans
+            selected.append(hit)
+            used_tokens += tokens
+            max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+        
+        return selected, used_tokens
+    
+    def _snippet_spans(self, hit: ChunkHit, query_emb: np.ndarray) -> List[Tuple[int, int]]:
+        """Passages du chunk à garder : meilleures phrases et voisines, ou le chunk entier"""
+        if self.sentence_index is not None:
+            spans = self.sentence_index.snippet(hit.idx, query_emb, self.snippet_sentences, self.snippet_window)
+            if spans:
+                return spans
+        return [self.chunks.span(hit.idx)]
+    
+    def _trim_overlap(
+        self,
+        hit: ChunkHit,
+        spans: List[Tuple[int, int]],
+        selected: List[ChunkHit]
+    ) -> List[Tuple[int, int]]:
+        """
+        Passages privés des octets déjà couverts par les extraits retenus du
+        même document ; vide si tout est couvert ou s'il ne reste que des
+        bribes (voir _clean_spans)
+        """
+        source_id = self.chunks.source_ids[hit.idx]
+        trimmed = False
+        for other in selected:
+            if self.chunks.source_ids[other.idx] != source_id:
+                continue
+            for covered_start, covered_end in other.spans or [self.chunks.span(other.idx)]:
+                remaining = []
+                for start, end in spans:
+                    if covered_end <= start or end <= covered_start:
+                        remaining.append((start, end))
+                        continue
+                    trimmed = True
+                    if start < covered_start:
+                        remaining.append((start, covered_start))
+                    if covered_end < end:
+                        remaining.append((covered_end, end))
+                spans = remaining
+        return self._clean_spans(hit, spans) if trimmed else spans
+    
+    def _clean_spans(self, hit: ChunkHit, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Restes d'une soustraction : bornes ramenées aux phrases entières
+        (sous-index de phrases), passages vides ou plus courts qu'une phrase
+        (séparateur, fin de phrase coupée) écartés
+        """
+        if self.sentence_index is not None:
+            rows = self.sentence_index.rows(hit.idx)
+            if len(rows):
+                starts = self.sentence_index.text_start[rows]
+                ends = self.sentence_index.text_end[rows]
+                snapped = []
+                for start, end in spans:
+                    inside = (starts >= start) & (ends <= end)
+                    if inside.any():
+                        snapped.append((int(starts[inside].min()), int(ends[inside].max())))
+                spans = snapped
+        
+        return [
+            (start, end) for start, end in spans
+            if len(self.chunks.text(hit.idx, (start, end)).strip()) >= MIN_EXTRACT_CHARS
+        ]
+    
+    def _span_tokens(self, hit: ChunkHit, spans: List[Tuple[int, int]]) -> int:
+        """Taille estimée des passages : longueur du chunk au prorata des octets conservés"""
+        start, end = self.chunks.span(hit.idx)
+        length = int(self.chunks.length_tokens[hit.idx])
+        if spans == [(start, end)] or end <= start:
+            return length
+        kept = sum(span_end - span_start for span_start, span_end in spans)
+        return int(np.ceil(length * kept / (end - start)))
+    
     def _build_context(self, results: List[Dict]) -> str:
         if not results:
             return "Aucun contexte trouvé."
@@ -168,8 +595,9 @@ class RetrievalAgent:
         
         for i, result in enumerate(results, 1):
             context += f"\n{'='*60}\n"
-            context += f"[Extrait {i}] Source : {result['source']}.pdf\n"
-            context += f"Score : {result.get('rerank_score', result['score']):.3f}\n"
+            page = f", page {result['page']}" if result.get('page') else ""
+            context += f"[Extrait {i}] Source : {result['source']}.pdf{page}\n"
+            context += f"Score : {result.get('relevance_score', result.get('rerank_score', result['score'])):.3f}\n"
             context += f"{'='*60}\n"
             context += result['text']
             context += "\n"
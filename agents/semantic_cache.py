@@ -0,0 +1,128 @@
+# agents/semantic_cache.py
+"""
+Cache sémantique des réponses, devant le pipeline complet
+
+Une question quasi identique à une question déjà traitée (même panne,
+formulée autrement) reçoit le résultat stocké au lieu de repasser par les
+quatre appels Mistral.
+
+- Index : FAISS IndexIDMap2(IndexFlatIP) sur les questions normalisées L2
+- Seuil : similarité cosinus minimale pour un hit
+- Éviction : TTL (secondes) + LRU (max_size entrées)
+- Invalidation : tout le cache est vidé quand la version de la KB change
+"""
+
+import time
+import threading
+import faiss
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class SemanticAnswerCache:
+    """
+    Résultats de tickets indexés par l'embedding de leur question
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600.0,
+        max_size: int = 512,
+        kb_version: Optional[int] = None
+    ):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.kb_version = kb_version
+
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        # id → (résultat, question, date de création), ordre LRU
+        self._entries: "OrderedDict[int, Tuple[Dict, str, float]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_emb: np.ndarray, kb_version: Optional[int] = None) -> Optional[Tuple[Dict, str, float]]:
+        """
+        Résultat stocké le plus proche au-dessus du seuil :
+        (résultat, question d'origine, similarité), None sinon
+        """
+        with self._lock:
+            self._check_version(kb_version)
+            self._expire()
+
+            if self.index.ntotal:
+                scores, ids = self.index.search(self._as_row(query_emb), min(4, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    entry_id = int(entry_id)
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    result, question, _ = self._entries[entry_id]
+                    return result, question, float(score)
+
+            self.misses += 1
+            return None
+
+    def store(self, query_emb: np.ndarray, question: str, result: Dict, kb_version: Optional[int] = None):
+        with self._lock:
+            self._check_version(kb_version)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(self._as_row(query_emb), np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (result, question, time.time())
+
+            while len(self._entries) > self.max_size:
+                oldest, _ = self._entries.popitem(last=False)
+                self.index.remove_ids(np.array([oldest], dtype="int64"))
+
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --------------------------------------------------
+    # Éviction (appelée sous verrou)
+    # --------------------------------------------------
+    def _check_version(self, kb_version: Optional[int]):
+        """KB ré-indexée : les réponses stockées ne sont plus fiables"""
+        if kb_version != self.kb_version:
+            self.index.reset()
+            self._entries.clear()
+            self.kb_version = kb_version
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            entry_id for entry_id, (_, _, created) in self._entries.items()
+            if now - created > self.ttl_seconds
+        ]
+        if expired:
+            for entry_id in expired:
+                del self._entries[entry_id]
+            self.index.remove_ids(np.array(expired, dtype="int64"))
+
+    def _as_row(self, query_emb: np.ndarray) -> np.ndarray:
+        row = np.array(query_emb, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(row)
+        return row
@@ -0,0 +1,216 @@
+# agents/sentence_index.py
+"""
+Sous-index de phrases (sélection extractive d'extraits)
+
+Les phrases sont celles du chunking (même découpage, mêmes spans en octets) :
+- chunk_ids  : uint32, position du chunk parent (dernier chunk commençant
+               avant la phrase ; avec l'overlap, une phrase peut aussi
+               appartenir au chunk précédent)
+- text_start / text_end : uint32, span de la phrase dans le document
+- vectors    : float16 (phrases, dim), embeddings normalisés L2
+Fichier : vector_db/doxa_kb.sentences.npz, lié au bundle par sa version
+
+Après la recherche de chunks, seules les phrases les plus proches de la
+requête (et leurs voisines) de chaque chunk sont gardées dans le contexte.
+"""
+
+import numpy as np
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from agents.chunk_store import ChunkStore
+
+SENTENCE_FILE = "doxa_kb.sentences.npz"
+
+
+class SentenceIndex:
+    """
+    Phrases des chunks avec leurs embeddings, triées par (source, début)
+    """
+
+    def __init__(
+        self,
+        chunks: ChunkStore,
+        chunk_ids: np.ndarray,
+        text_start: np.ndarray,
+        text_end: np.ndarray,
+        vectors: np.ndarray
+    ):
+        self.chunks = chunks
+        self.chunk_ids = chunk_ids
+        self.text_start = text_start
+        self.text_end = text_end
+        self.vectors = vectors
+
+        # Phrases de chaque source : lignes [source_rows[s], source_rows[s + 1])
+        source_ids = chunks.source_ids[chunk_ids] if len(chunk_ids) else np.empty(0, dtype="uint16")
+        self.source_rows = np.searchsorted(source_ids, np.arange(len(chunks.sources) + 1))
+
+    @classmethod
+    def build(
+        cls,
+        chunks: ChunkStore,
+        segment: Callable[[str], Iterable[Tuple[int, int]]],
+        encode: Callable[[List[str]], np.ndarray],
+        batch_size: int = 256
+    ) -> "SentenceIndex":
+        """
+        segment : texte d'un document → spans (début, fin) des phrases du chunking
+        encode  : textes → embeddings (appelé par lots de batch_size phrases)
+        """
+        return cls(chunks, *cls._segment(chunks, np.arange(len(chunks)), segment, encode, batch_size))
+
+    def update(
+        self,
+        chunks: ChunkStore,
+        keep: np.ndarray,
+        segment: Callable[[str], Iterable[Tuple[int, int]]],
+        encode: Callable[[List[str]], np.ndarray],
+        batch_size: int = 256
+    ) -> "SentenceIndex":
+        """
+        Index après ré-indexation incrémentale : phrases des chunks conservés
+        (masque `keep` sur les anciennes positions) renumérotées, seules les
+        phrases des nouveaux chunks (fin de table) sont découpées et encodées
+        """
+        positions = np.cumsum(keep) - 1
+        kept = keep[self.chunk_ids]
+        new_positions = np.arange(int(keep.sum()), len(chunks))
+        chunk_ids, starts, ends, vectors = self._segment(chunks, new_positions, segment, encode, batch_size)
+
+        chunk_ids = np.concatenate([positions[self.chunk_ids[kept]].astype("uint32"), chunk_ids])
+        starts = np.concatenate([self.text_start[kept], starts])
+        ends = np.concatenate([self.text_end[kept], ends])
+        kept_vectors = self.vectors[kept]
+        if len(kept_vectors) and len(vectors):
+            vectors = np.concatenate([kept_vectors, vectors])
+        elif not len(vectors):
+            vectors = kept_vectors
+
+        # Tri par (source, début) : une source modifiée revient en fin de table
+        order = np.lexsort((starts, chunks.source_ids[chunk_ids]))
+        return SentenceIndex(chunks, chunk_ids[order], starts[order], ends[order], vectors[order])
+
+    @staticmethod
+    def _segment(
+        chunks: ChunkStore,
+        positions: np.ndarray,
+        segment: Callable[[str], Iterable[Tuple[int, int]]],
+        encode: Callable[[List[str]], np.ndarray],
+        batch_size: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Phrases des documents des chunks `positions`, rattachées à ces chunks, encodées par lots"""
+        chunk_ids, starts, ends = [], [], []
+        texts: List[str] = []
+        batches: List[np.ndarray] = []
+
+        def flush():
+            vectors = np.asarray(encode(texts), dtype="float32")
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            batches.append((vectors / np.where(norms > 0, norms, 1.0)).astype("float16"))
+            texts.clear()
+
+        source_ids = chunks.source_ids[positions]
+        for source_id in np.unique(source_ids):
+            # Chunks du document, triés par début (ordre des chunk_id)
+            document_positions = positions[source_ids == source_id]
+            document_positions = document_positions[np.argsort(chunks.text_start[document_positions], kind="stable")]
+            text = chunks.document(chunks.sources[source_id])
+            document = text.encode("utf-8")
+            chunk_starts = chunks.text_start[document_positions]
+
+            for start, end in segment(text):
+                parent = max(int(np.searchsorted(chunk_starts, start, side="right")) - 1, 0)
+                chunk_ids.append(document_positions[parent])
+                starts.append(start)
+                ends.append(end)
+                texts.append(str(document[start:end], "utf-8"))
+                if len(texts) >= batch_size:
+                    flush()
+
+        if texts:
+            flush()
+        vectors = np.concatenate(batches) if batches else np.empty((0, 0), dtype="float16")
+
+        return (
+            np.array(chunk_ids, dtype="uint32"),
+            np.array(starts, dtype="uint32"),
+            np.array(ends, dtype="uint32"),
+            vectors
+        )
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def summary(self) -> str:
+        return f"{len(self)} phrases"
+
+    def rows(self, idx: int) -> np.ndarray:
+        """Lignes des phrases contenues dans le chunk `idx`"""
+        source_id = self.chunks.source_ids[idx]
+        low, high = self.source_rows[source_id], self.source_rows[source_id + 1]
+        start, end = self.chunks.span(idx)
+
+        first = low + np.searchsorted(self.text_start[low:high], start, side="left")
+        last = low + np.searchsorted(self.text_start[low:high], end, side="left")
+        rows = np.arange(first, last)
+        return rows[self.text_end[rows] <= end]
+
+    def snippet(
+        self,
+        idx: int,
+        query_emb: np.ndarray,
+        max_sentences: int = 2,
+        window: int = 1
+    ) -> Optional[List[Tuple[int, int]]]:
+        """
+        Spans à garder pour le chunk : les `max_sentences` phrases les plus
+        proches de la requête et `window` voisines de chaque côté, fusionnées
+        en passages contigus. None si le chunk est déjà assez court.
+        """
+        rows = self.rows(idx)
+        if len(rows) <= max_sentences * (2 * window + 1):
+            return None
+
+        similarities = self.vectors[rows].astype("float32") @ query_emb.reshape(-1)
+        keep = set()
+        for best in np.argsort(-similarities, kind="stable")[:max_sentences]:
+            keep.update(range(max(best - window, 0), min(best + window + 1, len(rows))))
+
+        spans: List[Tuple[int, int]] = []
+        previous = None
+        for i in sorted(keep):
+            start, end = int(self.text_start[rows[i]]), int(self.text_end[rows[i]])
+            if previous is not None and i == previous + 1:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+            previous = i
+        return spans
+
+    # --------------------------------------------------
+    # Persistance
+    # --------------------------------------------------
+    def save(self, path: Path, kb_version: int):
+        """Écriture atomique, liée à la version du bundle"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                kb_version=np.array(kb_version, dtype="int64"),
+                chunk_ids=self.chunk_ids,
+                text_start=self.text_start,
+                text_end=self.text_end,
+                vectors=self.vectors
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, chunks: ChunkStore) -> Tuple["SentenceIndex", int]:
+        with np.load(path) as data:
+            chunk_ids = data["chunk_ids"]
+            if len(chunk_ids) and int(chunk_ids.max()) >= len(chunks):
+                raise ValueError("phrases rattachées à des chunks absents")
+            index = cls(chunks, chunk_ids, data["text_start"], data["text_end"], data["vectors"])
+            return index, int(data["kb_version"])
@@ -0,0 +1,101 @@
+# agents/shard_router.py
+"""
+Recherche filtrée par document : un sous-index FAISS par source + routeur
+
+- shards    : un IndexFlatIP par source, positions globales associées
+              (les résultats restent des positions de la table de chunks)
+- routeur   : centroïde normalisé de chaque source ; quand plus de
+              `max_shards` documents sont autorisés, seuls les plus proches
+              de la requête sont parcourus
+
+Le filtre est appliqué avant le classement : une requête limitée à un petit
+document obtient ses top_k résultats au lieu de ce qui reste après
+sur-échantillonnage de l'index global.
+"""
+
+import faiss
+import numpy as np
+from typing import Dict, Iterable, List, Set, Tuple
+
+from agents.chunk_store import ChunkStore
+
+
+class ShardRouter:
+    """
+    Sous-index par document, construits à partir des vecteurs normalisés
+    de l'index global (même ordre que la table de chunks)
+    """
+
+    def __init__(self, chunks: ChunkStore, vectors: np.ndarray, max_shards: int = 8):
+        self.chunks = chunks
+        self.max_shards = max_shards
+        # source id → (sous-index, positions globales des chunks)
+        self.shards: Dict[int, Tuple[faiss.Index, np.ndarray]] = {}
+        self.centroids: Dict[int, np.ndarray] = {}
+
+        dimension = vectors.shape[1]
+        order = np.argsort(chunks.source_ids, kind="stable")
+        bounds = np.searchsorted(chunks.source_ids[order], np.arange(len(chunks.sources) + 1))
+
+        for source_id in range(len(chunks.sources)):
+            positions = order[bounds[source_id]:bounds[source_id + 1]].astype("int64")
+            if not len(positions):
+                continue
+
+            shard_vectors = np.ascontiguousarray(vectors[positions], dtype="float32")
+            shard = faiss.IndexFlatIP(dimension)
+            shard.add(shard_vectors)
+            self.shards[source_id] = (shard, positions)
+
+            centroid = shard_vectors.mean(axis=0)
+            self.centroids[source_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+    def _route(self, query: np.ndarray, allowed: List[int]) -> Set[int]:
+        """Shards à parcourir pour une requête : tous, ou les max_shards plus proches"""
+        if len(allowed) <= self.max_shards:
+            return set(allowed)
+
+        similarities = np.array([self.centroids[source_id] @ query for source_id in allowed])
+        best = np.argsort(-similarities)[:self.max_shards]
+        return {allowed[i] for i in best}
+
+    def search(self, queries: np.ndarray, sources: Iterable[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Recherche restreinte aux sources données, même contrat que index.search :
+        (scores, positions globales), complétés par -1 s'il y a moins de k chunks.
+        """
+        allowed = []
+        for name in dict.fromkeys(sources):
+            source_id = self.chunks.source_id(name)
+            if source_id is not None and source_id in self.shards:
+                allowed.append(source_id)
+
+        num_queries = len(queries)
+        scores = np.full((num_queries, k), -np.inf, dtype="float32")
+        ids = np.full((num_queries, k), -1, dtype="int64")
+        if not allowed:
+            return scores, ids
+
+        routed = [self._route(query, allowed) for query in queries]
+
+        all_scores = [scores]
+        all_ids = [ids]
+        for source_id in sorted(set().union(*routed)):
+            shard, positions = self.shards[source_id]
+            shard_scores, local_ids = shard.search(queries, min(k, shard.ntotal))
+
+            # Requêtes pour lesquelles le routeur a écarté ce shard
+            skipped = np.array([source_id not in routed_ids for routed_ids in routed])
+            shard_scores[skipped] = -np.inf
+
+            all_scores.append(shard_scores)
+            all_ids.append(np.where(local_ids >= 0, positions[local_ids], -1))
+
+        merged_scores = np.hstack(all_scores)
+        merged_ids = np.hstack(all_ids)
+        best = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+
+        scores = np.take_along_axis(merged_scores, best, axis=1)
+        ids = np.take_along_axis(merged_ids, best, axis=1)
+        ids[~np.isfinite(scores)] = -1
+        return scores, ids
@@ -2,6 +2,43 @@
 from agno.agent import Agent
 from agno.models.mistral import MistralChat
 import json
+from typing import Optional
+
+from agents.llm_cache import CachedAgent, LLMCache
+
+# --------------------------------------------------
+# Instructions (partagées avec le FusedAnalyzer)
+# --------------------------------------------------
+TRIAGE_MISSION = [
+    "1. COHERENCE : La question a-t-elle du sens ? (oui/non)",
+    "2. INTENTION : Que veut le client ? (1 phrase)",
+    "3. TYPE_QUESTION : bug|question|feedback|account",
+    "4. EXCEPTIONS : Détecter émotions négatives et données sensibles",
+]
+
+TRIAGE_EXCEPTION_RULES = [
+    "⚠️ DÉTECTION EXCEPTIONS :",
+    "",
+    "A. ÉMOTIONS NÉGATIVES (escalade) :",
+    "   - Colère : 'furieux', 'énervé', 'inacceptable'",
+    "   - Frustration : 'encore', 'toujours', '3ème fois'",
+    "   - Menaces : 'annuler', 'avocat'",
+    "   → Ajoute 'emotion_negative' dans exceptions",
+    "",
+    "B. DONNÉES SENSIBLES (escalade critique) :",
+    "   - Mots de passe : 'mon mdp est', 'password:'",
+    "   - Cartes bancaires : 16 chiffres",
+    "   - Téléphones : +213, 05XX, 06XX",
+    "   → Ajoute 'data_sensitive' dans exceptions",
+]
+
+TRIAGE_JSON_FIELDS = [
+    '"coherent": true/false,',
+    '"intention": "...",',
+    '"type_question": "bug|question|feedback|account",',
+    '"reasoning": "...",',
+    '"exceptions": []',
+]
 
 
 class TriageAgent:
@@ -10,8 +47,8 @@ class TriageAgent:
     Détecte : cohérence, intention, exceptions (émotions + données sensibles)
     """
     
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, llm_cache: Optional[LLMCache] = None):
+        self.agent = CachedAgent(Agent(
             name="Doxa Triage Agent",
             model=MistralChat(id="mistral-small-latest"),
             description="Agent de triage pour support client Doxa",
@@ -20,36 +57,17 @@ class TriageAgent:
                 "",
                 "📋 TA MISSION :",
                 "Analyser chaque ticket client et déterminer :",
-                "1. COHERENCE : La question a-t-elle du sens ? (oui/non)",
-                "2. INTENTION : Que veut le client ? (1 phrase)",
-                "3. TYPE_QUESTION : bug|question|feedback|account",
-                "4. EXCEPTIONS : Détecter émotions négatives et données sensibles",
-                "",
-                "⚠️ DÉTECTION EXCEPTIONS :",
-                "",
-                "A. ÉMOTIONS NÉGATIVES (escalade) :",
-                "   - Colère : 'furieux', 'énervé', 'inacceptable'",
-                "   - Frustration : 'encore', 'toujours', '3ème fois'",
-                "   - Menaces : 'annuler', 'avocat'",
-                "   → Ajoute 'emotion_negative' dans exceptions",
+                *TRIAGE_MISSION,
                 "",
-                "B. DONNÉES SENSIBLES (escalade critique) :",
-                "   - Mots de passe : 'mon mdp est', 'password:'",
-                "   - Cartes bancaires : 16 chiffres",
-                "   - Téléphones : +213, 05XX, 06XX",
-                "   → Ajoute 'data_sensitive' dans exceptions",
+                *TRIAGE_EXCEPTION_RULES,
                 "",
                 "📤 FORMAT RÉPONSE (JSON strict) :",
                 "{",
-                '  "coherent": true/false,',
-                '  "intention": "...",',
-                '  "type_question": "bug|question|feedback|account",',
-                '  "reasoning": "...",',
-                '  "exceptions": []',
+                *("  " + field for field in TRIAGE_JSON_FIELDS),
                 "}"
             ],
             markdown=False
-        )
+        ), llm_cache)
     
     def analyze(self, question: str) -> dict:
         prompt = f"""Analyse ce ticket client Doxa :
@@ -76,6 +94,7 @@ Réponds UNIQUEMENT avec le JSON demandé."""
                 json_str = content[start:end]
                 result = json.loads(json_str)
                 result = self._validate_result(result)
+                self.agent.remember(prompt, response)
                 return result
             else:
                 return self._fallback_response(question, "JSON non trouvé")
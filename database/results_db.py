@@ -34,6 +34,7 @@ class ResultsDB:
         self.conn.row_factory = sqlite3.Row  # Pour accéder par nom de colonne
         
         self._create_tables()
+        self._migrate()
         self._create_indexes()
         
         print(f"✅ Base de données initialisée : {self.db_path}")
@@ -74,7 +75,10 @@ class ResultsDB:
                 execution_time_triage REAL,
                 execution_time_query REAL,
                 execution_time_retrieval REAL,
-                execution_time_response REAL
+                execution_time_response REAL,
+                
+                -- Provenance de la décision (regle, llm, regle_secours)
+                decision_provenance TEXT
             )
         """)
         
@@ -85,6 +89,7 @@ class ResultsDB:
                 ticket_id TEXT NOT NULL,
                 source TEXT NOT NULL,
                 chunk_id INTEGER,
+                page INTEGER,
                 score REAL,
                 rank INTEGER,
                 text_preview TEXT,
@@ -126,6 +131,21 @@ class ResultsDB:
         
         self.conn.commit()
     
+    def _migrate(self):
+        """Ajoute les colonnes apparues après la création d'une base existante"""
+        
+        cursor = self.conn.cursor()
+        
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(rag_docs)")}
+        if 'page' not in columns:
+            cursor.execute("ALTER TABLE rag_docs ADD COLUMN page INTEGER")
+        
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(tickets)")}
+        if 'decision_provenance' not in columns:
+            cursor.execute("ALTER TABLE tickets ADD COLUMN decision_provenance TEXT")
+        
+        self.conn.commit()
+    
     def _create_indexes(self):
         """Crée les index pour optimiser les requêtes"""
         
@@ -199,7 +219,10 @@ class ResultsDB:
             self._parse_time(exec_time.get('triage', '0s')),
             self._parse_time(exec_time.get('query_processing', '0s')),
             self._parse_time(exec_time.get('retrieval', '0s')),
-            self._parse_time(exec_time.get('response', '0s'))
+            self._parse_time(exec_time.get('response', '0s')),
+            
+            # Provenance de la décision
+            evaluation.get('provenance', '')
         )
         
         # Insérer ticket
@@ -209,7 +232,8 @@ class ResultsDB:
                 ?, ?, ?, ?,
                 ?, ?, ?, ?,
                 ?, ?, ?, ?,
-                ?, ?, ?, ?, ?
+                ?, ?, ?, ?, ?,
+                ?
             )
         """, values)
         
@@ -235,12 +259,13 @@ class ResultsDB:
         
         for i, chunk in enumerate(retrieval.get('chunks', []), 1):
             cursor.execute("""
-                INSERT INTO rag_docs (ticket_id, source, chunk_id, score, rank, text_preview)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO rag_docs (ticket_id, source, chunk_id, page, score, rank, text_preview)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (
                 ticket_id,
                 chunk.get('source', ''),
                 chunk.get('chunk_id', 0),
+                chunk.get('page'),
                 chunk.get('score', 0.0),
                 i,
                 chunk.get('text', '')[:200]  # Preview 200 chars
@@ -330,7 +355,16 @@ class ResultsDB:
             ORDER BY COUNT(*) DESC
         """)
         stats['by_categorie'] = dict(cursor.fetchall())
-        
+
+        # Par provenance de la décision (règle / LLM)
+        cursor.execute("""
+            SELECT decision_provenance, COUNT(*)
+            FROM tickets
+            WHERE decision_provenance IS NOT NULL AND decision_provenance != ''
+            GROUP BY decision_provenance
+        """)
+        stats['by_provenance'] = dict(cursor.fetchall())
+
         # Temps moyen
         cursor.execute("""
             SELECT AVG(execution_time_total) 
@@ -87,17 +87,21 @@ def setup_knowledge_base(pdf_dir: str, force_rebuild: bool = False):
     
     setup_start = time.time()
     
-    processor = DocumentProcessor(pdf_dir)
+    # Index mappé en mémoire : démarrage à froid indépendant de la taille de la KB
+    processor = DocumentProcessor(pdf_dir, mmap_index=True)
     
     # Essayer de charger l'index existant
     if not force_rebuild and processor.load_index():
+        # Ré-indexe uniquement les PDFs ajoutés / modifiés / supprimés
+        processor.process_incremental()
+        
         load_time = time.time() - setup_start
         
         print("✅ Index FAISS chargé depuis le disque")
         print(f"   • Temps de chargement : {load_time:.2f}s")
         print(f"   • Vecteurs            : {processor.index.ntotal}")
         print(f"   • Chunks              : {len(processor.documents)}")
-        print(f"   • Documents           : {len(set(m['source'] for m in processor.metadata))}\n")
+        print(f"   • Documents           : {len(processor.chunks.source_counts())}\n")
     else:
         print("🔨 Création de l'index FAISS (peut prendre 1-2 min)...\n")
         